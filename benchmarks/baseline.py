@@ -0,0 +1,66 @@
+import json
+import platform
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+Results = Dict[str, Dict[str, float]]
+
+# Rates and latencies are compared; counts such as 'requests', 'errors'
+# and 'rows' only describe the run and are skipped.
+HIGHER_IS_BETTER = {'rps', 'ops_per_sec'}
+LOWER_IS_BETTER = {
+    'p50_ms', 'p95_ms', 'p99_ms', 'us_per_op', 'us_per_row',
+    'tuple_bytes', 'heap_bytes_per_row', 'index_bytes_per_row',
+    'bytes_per_row',
+}
+
+
+def save(path: str, results: Results) -> None:
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(
+            {
+                'created_at': datetime.utcnow().isoformat(),
+                'python': sys.version.split()[0],
+                'machine': platform.machine(),
+                'results': results,
+            },
+            file,
+            indent=2,
+            sort_keys=True
+        )
+
+
+def load(path: str) -> Results:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)['results']
+
+
+def compare(
+        baseline: Results,
+        results: Results,
+        tolerance: float
+) -> List[str]:
+    """
+    Print the change of every metric against ``baseline`` and return the
+    ones that got worse by more than ``tolerance`` (0.1 is 10%).
+    """
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        for metric, value in sorted(metrics.items()):
+            if metric not in HIGHER_IS_BETTER | LOWER_IS_BETTER:
+                continue
+            before = baseline.get(name, {}).get(metric)
+            if not before:
+                continue
+            change = (value - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            mark = ''
+            if worse > tolerance:
+                mark = '  REGRESSION'
+                regressions.append(f'{name}.{metric}')
+            print(
+                f'{name:<32} {metric:<12} {before:>12.3f} -> {value:>12.3f}'
+                f' ({change:+.1%}){mark}'
+            )
+    return regressions
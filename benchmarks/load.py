@@ -0,0 +1,194 @@
+"""
+Load generator driving redirect, create, shorten and status at a fixed
+concurrency against a running service.
+
+    python -m benchmarks.load --start-server --duration 10 --save load.json
+    python -m benchmarks.load --compare load.json
+
+The service needs PostgreSQL (``DATABASE_DSN``): it relies on sequences,
+``ON CONFLICT`` and ``date_trunc``, so SQLite cannot stand in for it.
+"""
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import baseline
+
+SHORT_URL_PATH = '/api/v1/short_url/'
+# Whatever REDIRECT_STATUS and the per-link policies choose.
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(','):
+        name, weight = item.split('=')
+        weights[name] = float(weight)
+    unknown = set(weights) - set(SCENARIOS)
+    assert not unknown, f'Unknown scenarios {unknown}'
+    return weights
+
+
+async def redirect(client: httpx.AsyncClient, codes: List[str], args) -> bool:
+    response = await client.get(SHORT_URL_PATH + random.choice(codes))
+    return response.status_code in REDIRECT_STATUSES
+
+
+async def create(client: httpx.AsyncClient, codes: List[str], args) -> bool:
+    response = await client.post(
+        SHORT_URL_PATH, json={'origin_url': 'http://example.com/load'}
+    )
+    return response.status_code == 201
+
+
+async def shorten(client: httpx.AsyncClient, codes: List[str], args) -> bool:
+    response = await client.post(
+        SHORT_URL_PATH + 'shorten',
+        json=[{'origin_url': 'http://example.com/load'}] * args.shorten_size
+    )
+    return response.status_code == 201
+
+
+async def status(client: httpx.AsyncClient, codes: List[str], args) -> bool:
+    response = await client.get(
+        SHORT_URL_PATH + random.choice(codes) + '/status'
+    )
+    return response.status_code == 200
+
+
+SCENARIOS = {
+    'redirect': redirect,
+    'create': create,
+    'shorten': shorten,
+    'status': status,
+}
+
+
+async def seed(client: httpx.AsyncClient, links: int) -> List[str]:
+    response = await client.post(
+        SHORT_URL_PATH + 'shorten',
+        json=[{'origin_url': 'http://example.com/seed'}] * links
+    )
+    response.raise_for_status()
+    return [item['short_form'] for item in response.json()]
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        limits=httpx.Limits(max_connections=args.concurrency),
+        timeout=30
+    ) as client:
+        codes = await seed(client, args.links)
+        deadline = time.perf_counter() + args.duration
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                name = random.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    ok = await SCENARIOS[name](client, codes, args)
+                except httpx.HTTPError:
+                    ok = False
+                latencies[name].append(time.perf_counter() - started)
+                if not ok:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies['total'] = [
+        value for name in names for value in latencies[name]
+    ]
+    errors['total'] = sum(errors.values())
+    return {
+        name: {
+            'requests': len(values),
+            'errors': errors[name],
+            'rps': len(values) / elapsed,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+        }
+        for name, values in latencies.items() if values
+    }
+
+
+def start_server(base_url: str) -> subprocess.Popen:
+    parts = urlsplit(base_url)
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'uvicorn', 'src.main:app',
+            '--host', parts.hostname, '--port', str(parts.port or 80),
+            '--log-level', 'warning',
+        ],
+    )
+    for _ in range(100):
+        try:
+            httpx.get(base_url + '/api/openapi.json')
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'Server at {base_url} did not start')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8090')
+    parser.add_argument('--start-server', action='store_true',
+                        help='Run uvicorn with src.main:app for the test.')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--mix', default='redirect=80,create=10,shorten=2,status=8',
+                        help='Scenario weights.')
+    parser.add_argument('--links', type=int, default=100,
+                        help='Links created up front for redirect and status.')
+    parser.add_argument('--shorten-size', type=int, default=10)
+    parser.add_argument('--save', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='Compare with this JSON baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    server = start_server(args.base_url) if args.start_server else None
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print(f"{'scenario':<10} {'requests':>9} {'errors':>7} {'rps':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, metrics in results.items():
+        print(f"{name:<10} {metrics['requests']:>9} {metrics['errors']:>7} "
+              f"{metrics['rps']:>9.1f} {metrics['p50_ms']:>8.2f} "
+              f"{metrics['p95_ms']:>8.2f} {metrics['p99_ms']:>8.2f}")
+    if args.save:
+        baseline.save(args.save, results)
+    if args.compare:
+        return int(bool(baseline.compare(
+            baseline.load(args.compare), results, args.tolerance
+        )))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
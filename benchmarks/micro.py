@@ -0,0 +1,129 @@
+"""
+Microbenchmarks of request path helpers that do not need a database.
+
+    python -m benchmarks.micro --save micro.json
+    python -m benchmarks.micro --compare micro.json
+"""
+import argparse
+import asyncio
+import sys
+import time
+import timeit
+from datetime import datetime
+from typing import Callable, Dict
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from src.api.v1.tools import check_short_url
+from src.middlewares.black_list import BlackListHostMiddleware
+from src.schemas import short_url as short_url_schema
+from src.services.cache import CachedShortUrl
+from src.services.urls_app import short_url_crud
+from . import baseline
+
+REPEAT = 5
+
+
+def bench(func: Callable[[], object]) -> float:
+    """Best of ``REPEAT`` runs, in microseconds per call."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(REPEAT, number)) / number * 1e6
+
+
+def bench_async(make_call: Callable[[], object], number: int = 20000) -> float:
+    async def run() -> float:
+        best = float('inf')
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            for _ in range(number):
+                await make_call()
+            best = min(best, time.perf_counter() - started)
+        return best / number * 1e6
+
+    return asyncio.run(run())
+
+
+async def noop_app(scope, receive, send) -> None:
+    pass
+
+
+def black_list_call() -> Callable[[], object]:
+    middleware = BlackListHostMiddleware(
+        noop_app,
+        blocked_hosts=[f'host{index}.com' for index in range(1000)]
+        + [f'*.blocked{index}.org' for index in range(1000)]
+    )
+    scope = {
+        'type': 'http',
+        'headers': [(b'host', b'api.allowed.example.com:8080')],
+    }
+    return lambda: middleware(scope, None, None)
+
+
+def short_url_model():
+    db_obj = short_url_crud.create_obj({'origin_url': 'http://ya.ru'}, 'abc123')
+    db_obj.id = 1
+    db_obj.created_at = datetime.utcnow()
+    db_obj.deleted = False
+    return db_obj
+
+
+def run() -> Dict[str, Dict[str, float]]:
+    db_obj = short_url_model()
+    cached = CachedShortUrl.from_model(db_obj)
+    requests = [
+        {
+            'made_at': datetime.utcnow(),
+            'client_host': '127.0.0.1',
+            'client_port': 50000 + index,
+        }
+        for index in range(100)
+    ]
+    cases = {
+        'create_obj': lambda: short_url_crud.create_obj(
+            {'origin_url': 'http://ya.ru'}, 'abc123'
+        ),
+        'check_short_url': lambda: check_short_url(
+            short_url=cached, url_id='abc123'
+        ),
+        'schema_short_url': lambda: orjson.dumps(jsonable_encoder(
+            short_url_schema.ShortUrl.from_orm(db_obj)
+        )),
+        'schema_list_request_100': lambda: orjson.dumps(jsonable_encoder(
+            short_url_schema.ListRequest.parse_obj(requests)
+        )),
+    }
+    results = {
+        name: {'us_per_op': bench(func)} for name, func in cases.items()
+    }
+    results['black_list_middleware'] = {
+        'us_per_op': bench_async(black_list_call())
+    }
+    for metrics in results.values():
+        metrics['ops_per_sec'] = 1e6 / metrics['us_per_op']
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--save', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='Compare with this JSON baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = run()
+    for name, metrics in results.items():
+        print(f"{name:<32} {metrics['us_per_op']:>10.2f} us/op")
+    if args.save:
+        baseline.save(args.save, results)
+    if args.compare:
+        return int(bool(baseline.compare(
+            baseline.load(args.compare), results, args.tolerance
+        )))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+CPU per row of the ORM and Core read paths of the hot queries.
+
+    python -m benchmarks.reads --save reads.json
+    python -m benchmarks.reads --compare reads.json
+
+Needs the PostgreSQL from DATABASE_DSN. Creates one link with ``--rows``
+requests, times the redirect lookup and a full-info status page of every
+row through both paths, then deletes the link. Time is process CPU time,
+so the database server's share is left out.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import delete, insert, select
+
+from src.api.v1.tools import status_page
+from src.db.db import async_session, engine
+from src.models.urls_app import Request as RequestModel
+from src.models.urls_app import ShortUrl as ShortUrlModel
+from src.schemas import short_url as short_url_schema
+from src.services.cache import CachedShortUrl
+from src.services.urls_app import RepositoryShortUrl
+from . import baseline
+
+SHORT_FORM = 'bench0'
+
+
+async def cpu_per_call(
+        call: Callable[[], Awaitable[object]],
+        number: int,
+        repeat: int = 5
+) -> float:
+    """Best of ``repeat`` runs, in process CPU microseconds per call."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.process_time()
+        for _ in range(number):
+            await call()
+        best = min(best, time.process_time() - started)
+    return best / number * 1e6
+
+
+async def orm_lookup(crud: RepositoryShortUrl) -> CachedShortUrl:
+    """The previous redirect lookup: an ORM entity copied into the cache."""
+    async with async_session() as session:
+        results = await session.execute(
+            select(ShortUrlModel).where(ShortUrlModel.short_form == SHORT_FORM)
+        )
+        return CachedShortUrl.from_model(results.scalar_one_or_none())
+
+
+async def core_lookup(crud: RepositoryShortUrl) -> CachedShortUrl:
+    async with async_session() as session:
+        return await crud.get_link(session, SHORT_FORM)
+
+
+async def orm_status(link_id: int, rows: int) -> bytes:
+    """The previous status page: entities, response model and encoder."""
+    async with async_session() as session:
+        results = await session.execute(
+            select(
+                RequestModel
+            ).where(
+                RequestModel.url_id == link_id
+            ).order_by(
+                RequestModel.made_at, RequestModel.id
+            ).limit(rows)
+        )
+        requests = results.scalars().all()
+    page = short_url_schema.ListRequest.parse_obj(requests)
+    return ORJSONResponse(jsonable_encoder(page)).body
+
+
+async def core_status(
+        crud: RepositoryShortUrl,
+        link_id: int,
+        rows: int
+) -> bytes:
+    async with async_session() as session:
+        requests = await crud.get_status(
+            session, link_id, limit=rows, offset=0, full_info=True
+        )
+    return status_page(requests)
+
+
+async def prepare(rows: int) -> int:
+    async with async_session() as session:
+        await cleanup(session)
+        results = await session.execute(
+            insert(ShortUrlModel).values(
+                origin_url='http://example.com/bench',
+                short_form=SHORT_FORM,
+                created_at=datetime.utcnow()
+            ).returning(ShortUrlModel.id)
+        )
+        link_id = results.scalar_one()
+        started = datetime.utcnow()
+        await session.execute(
+            insert(RequestModel),
+            [
+                {
+                    'url_id': link_id,
+                    'made_at': started + timedelta(microseconds=index),
+                    'client_host': '10.0.0.1',
+                    'client_port': index % 65536,
+                }
+                for index in range(rows)
+            ]
+        )
+        await session.commit()
+    return link_id
+
+
+async def cleanup(session) -> None:
+    links = ShortUrlModel.__table__
+    requests = RequestModel.__table__
+    link_ids = select(links.c.id).where(
+        links.c.short_form == SHORT_FORM
+    ).scalar_subquery()
+    await session.execute(
+        delete(requests).where(requests.c.url_id.in_(link_ids))
+    )
+    await session.execute(
+        delete(links).where(links.c.short_form == SHORT_FORM)
+    )
+    await session.commit()
+
+
+async def run(rows: int, number: int) -> Dict[str, Dict[str, float]]:
+    crud = RepositoryShortUrl(ShortUrlModel, RequestModel, allocator=None)
+    link_id = await prepare(rows)
+    try:
+        assert await orm_status(link_id, rows) == await core_status(
+            crud, link_id, rows
+        ), 'Both status paths must render the same JSON'
+        cases = {
+            'lookup_orm': (lambda: orm_lookup(crud), 1),
+            'lookup_core': (lambda: core_lookup(crud), 1),
+            'status_orm': (lambda: orm_status(link_id, rows), rows),
+            'status_core': (lambda: core_status(crud, link_id, rows), rows),
+        }
+        results = {}
+        for name, (call, per_call_rows) in cases.items():
+            us_per_op = await cpu_per_call(call, number)
+            results[name] = {
+                'us_per_op': us_per_op,
+                'us_per_row': us_per_op / per_call_rows,
+            }
+    finally:
+        async with async_session() as session:
+            await cleanup(session)
+        await engine.dispose()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=20)
+    parser.add_argument('--save', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='Compare with this JSON baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.rows, args.number))
+    for name, metrics in results.items():
+        print(
+            f"{name:<16} {metrics['us_per_op']:>10.1f} us/op"
+            f" {metrics['us_per_row']:>8.2f} us/row"
+        )
+    if args.save:
+        baseline.save(args.save, results)
+    if args.compare:
+        return int(bool(baseline.compare(
+            baseline.load(args.compare), results, args.tolerance
+        )))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
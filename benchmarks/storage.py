@@ -0,0 +1,94 @@
+"""
+Bytes per row of the service tables and their indexes.
+
+    python -m benchmarks.storage --vacuum --save storage.json
+    python -m benchmarks.storage --compare storage.json
+
+Needs the PostgreSQL from DATABASE_DSN. ``--vacuum`` rewrites the tables
+first (VACUUM FULL takes an exclusive lock) so bloat does not blur the
+comparison.
+"""
+import argparse
+import asyncio
+import sys
+from typing import Dict
+
+from sqlalchemy import text
+
+from src.db.db import engine
+from . import baseline
+
+TABLES = ('short_urls', 'requests')
+
+# pg_partition_tree is empty for a plain table, and partitioned parents
+# and their indexes take no space themselves.
+SIZE_QUERY = text(
+    'SELECT sum(pg_relation_size(relid)), sum(pg_indexes_size(relid)) '
+    'FROM (SELECT relid FROM pg_partition_tree(CAST(:table AS regclass)) '
+    'UNION SELECT CAST(:table AS regclass)) AS tree'
+)
+
+
+async def measure() -> Dict[str, Dict[str, float]]:
+    results = {}
+    async with engine.connect() as connection:
+        for table in TABLES:
+            rows, tuple_bytes = (await connection.execute(text(
+                f'SELECT count(*), coalesce(avg(pg_column_size({table}.*)), 0) '
+                f'FROM {table}'
+            ))).one()
+            heap_bytes, index_bytes = (await connection.execute(
+                SIZE_QUERY, {'table': table}
+            )).one()
+            per_row = 1 / max(rows, 1)
+            results[table] = {
+                'rows': float(rows),
+                'tuple_bytes': float(tuple_bytes),
+                'heap_bytes_per_row': float(heap_bytes) * per_row,
+                'index_bytes_per_row': float(index_bytes) * per_row,
+                'bytes_per_row': float(heap_bytes + index_bytes) * per_row,
+            }
+    await engine.dispose()
+    return results
+
+
+async def vacuum() -> None:
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(
+            isolation_level='AUTOCOMMIT'
+        )
+        for table in TABLES:
+            await connection.execute(text(f'VACUUM (FULL, ANALYZE) {table}'))
+    await engine.dispose()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--vacuum', action='store_true')
+    parser.add_argument('--save', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='Compare with this JSON baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.vacuum:
+        asyncio.run(vacuum())
+    results = asyncio.run(measure())
+    for table, metrics in results.items():
+        print(
+            f"{table:<12} {metrics['rows']:>10.0f} rows"
+            f" {metrics['tuple_bytes']:>7.1f} B tuple"
+            f" {metrics['heap_bytes_per_row']:>7.1f} B heap"
+            f" {metrics['index_bytes_per_row']:>7.1f} B index"
+            f" {metrics['bytes_per_row']:>7.1f} B/row"
+        )
+    if args.save:
+        baseline.save(args.save, results)
+    if args.compare:
+        return int(bool(baseline.compare(
+            baseline.load(args.compare), results, args.tolerance
+        )))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
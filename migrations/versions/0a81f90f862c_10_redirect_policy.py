@@ -0,0 +1,32 @@
+"""10_redirect_policy
+
+Revision ID: 0a81f90f862c
+Revises: 5758513c7072
+Create Date: 2026-10-18 18:47:39.797500
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0a81f90f862c'
+down_revision = '5758513c7072'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'short_urls',
+        sa.Column('redirect_status', sa.SmallInteger(), nullable=True)
+    )
+    op.add_column(
+        'short_urls',
+        sa.Column('cache_max_age', sa.Integer(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('short_urls', 'cache_max_age')
+    op.drop_column('short_urls', 'redirect_status')
@@ -0,0 +1,81 @@
+"""08_origin_hash
+
+Revision ID: 0d39f364d3b8
+Revises: f419b44df765
+Create Date: 2026-10-18 18:42:54.525985
+
+"""
+import hashlib
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0d39f364d3b8'
+down_revision = 'f419b44df765'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+# Copies of src.services.dedup as of this revision, so later changes to
+# the normalization cannot change what the backfill computes.
+def normalize_url(url: str) -> str:
+    url = url.strip()
+    parts = urlsplit(url)
+    try:
+        port: Optional[int] = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ''
+    if ':' in host:
+        host = f'[{host}]'
+    userinfo, at, _ = parts.netloc.rpartition('@')
+    netloc = userinfo + at + host
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{port}'
+    path = parts.path or ('/' if netloc else '')
+    return urlunsplit((scheme, netloc, path, parts.query, parts.fragment))
+
+
+def origin_hash(url: str) -> int:
+    digest = hashlib.blake2b(
+        normalize_url(url).encode(), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def upgrade() -> None:
+    op.add_column(
+        'short_urls',
+        sa.Column('origin_hash', sa.BigInteger(), nullable=True)
+    )
+    # The hash depends on URL normalization, which SQL cannot reproduce.
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            'SELECT id, origin_url FROM short_urls '
+            'WHERE id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': BACKFILL_BATCH_SIZE}).all()
+        if not rows:
+            break
+        connection.execute(
+            sa.text('UPDATE short_urls SET origin_hash = :hash WHERE id = :id'),
+            [{'id': id_, 'hash': origin_hash(url)} for id_, url in rows]
+        )
+        last_id = rows[-1].id
+    op.create_index(
+        op.f('ix_short_urls_origin_hash'), 'short_urls', ['origin_hash']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_short_urls_origin_hash'), table_name='short_urls')
+    op.drop_column('short_urls', 'origin_hash')
@@ -0,0 +1,87 @@
+"""04_short-form-index
+
+Revision ID: 271e97c12499
+Revises: ce0be1c490e9
+Create Date: 2026-10-18 18:08:23.059115
+
+"""
+import logging
+import string
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '271e97c12499'
+down_revision = 'ce0be1c490e9'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# Copy of the code encoding of src.services.allocator as of this revision.
+ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+CODE_LENGTH = 6
+PREFIXES = '01IOl'
+TAIL_SPACE = len(ALPHABET) ** (CODE_LENGTH - 1)
+CAPACITY = len(PREFIXES) * TAIL_SPACE
+MULTIPLIER = 2654435761
+OFFSET = 1500450271
+
+# Every link sharing its short_form with an older one.
+DUPLICATES_QUERY = sa.text(
+    'SELECT id, short_form FROM ('
+    'SELECT id, short_form, row_number() OVER ('
+    'PARTITION BY short_form ORDER BY id) AS position '
+    'FROM short_urls) AS codes '
+    'WHERE position > 1 ORDER BY id'
+)
+RECODE = sa.text(
+    'UPDATE short_urls SET short_form = :code, short_url = '
+    'left(short_url, length(short_url) - length(short_form)) || :code '
+    'WHERE id = :id'
+)
+
+
+def encode(number: int) -> str:
+    value = (number * MULTIPLIER + OFFSET) % CAPACITY
+    prefix, value = divmod(value, TAIL_SPACE)
+    tail = []
+    for _ in range(CODE_LENGTH - 1):
+        value, digit = divmod(value, len(ALPHABET))
+        tail.append(ALPHABET[digit])
+    return PREFIXES[prefix] + ''.join(reversed(tail))
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('short_form_seq')))
+    # Legacy random codes may collide. The oldest link keeps its code, the
+    # others get allocator codes, which never clash with legacy ones.
+    connection = op.get_bind()
+    for link_id, short_form in connection.execute(DUPLICATES_QUERY).all():
+        code = encode(connection.scalar(sa.text("SELECT nextval('short_form_seq')")))
+        connection.execute(RECODE, {'id': link_id, 'code': code})
+        logger.warning(
+            'Link %s re-coded from duplicate %s to %s',
+            link_id, short_form, code
+        )
+    # Built without blocking writes to short_urls.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_short_urls_short_form'),
+            'short_urls',
+            ['short_form'],
+            unique=True,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f('ix_short_urls_short_form'),
+            table_name='short_urls',
+            postgresql_concurrently=True
+        )
+    op.execute(sa.schema.DropSequence(sa.Sequence('short_form_seq')))
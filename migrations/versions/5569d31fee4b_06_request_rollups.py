@@ -0,0 +1,38 @@
+"""06_request-rollups
+
+Revision ID: 5569d31fee4b
+Revises: 890708e6e7ce
+Create Date: 2026-10-18 18:13:48.935142
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5569d31fee4b'
+down_revision = '890708e6e7ce'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('request_rollups',
+    sa.Column('url_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(length=6), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('requests_number', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['url_id'], ['short_urls.id'], ),
+    sa.PrimaryKeyConstraint('url_id', 'granularity', 'bucket')
+    )
+    rollup_state = op.create_table('rollup_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('last_request_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(rollup_state, [{'id': 1, 'last_request_id': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_state')
+    op.drop_table('request_rollups')
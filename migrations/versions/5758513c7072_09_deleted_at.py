@@ -0,0 +1,39 @@
+"""09_deleted_at
+
+Revision ID: 5758513c7072
+Revises: 0d39f364d3b8
+Create Date: 2026-10-18 18:45:07.089138
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5758513c7072'
+down_revision = '0d39f364d3b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'short_urls', sa.Column('deleted_at', sa.DateTime(), nullable=True)
+    )
+    # The deletion time of existing links is unknown, the grace period
+    # starts now.
+    op.execute(
+        "UPDATE short_urls SET deleted_at = now() AT TIME ZONE 'utc' "
+        'WHERE deleted'
+    )
+    op.create_index(
+        'ix_short_urls_deleted_at',
+        'short_urls',
+        ['deleted_at'],
+        postgresql_where=sa.text('deleted')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_short_urls_deleted_at', table_name='short_urls')
+    op.drop_column('short_urls', 'deleted_at')
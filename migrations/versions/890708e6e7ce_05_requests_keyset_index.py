@@ -0,0 +1,28 @@
+"""05_requests-keyset-index
+
+Revision ID: 890708e6e7ce
+Revises: 271e97c12499
+Create Date: 2026-10-18 18:10:45.814019
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '890708e6e7ce'
+down_revision = '271e97c12499'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_requests_url_id_made_at_id',
+        'requests',
+        ['url_id', 'made_at', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_requests_url_id_made_at_id', table_name='requests')
@@ -0,0 +1,38 @@
+"""03_requests-number
+
+Revision ID: ce0be1c490e9
+Revises: 5e8e91ae644c
+Create Date: 2026-10-18 18:07:13.537379
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'ce0be1c490e9'
+down_revision = '5e8e91ae644c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'short_urls',
+        sa.Column(
+            'requests_number',
+            sa.Integer(),
+            server_default='0',
+            nullable=False
+        )
+    )
+    op.execute(
+        'UPDATE short_urls SET requests_number = counts.requests_number '
+        'FROM (SELECT url_id, count(*) AS requests_number '
+        'FROM requests GROUP BY url_id) AS counts '
+        'WHERE short_urls.id = counts.url_id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('short_urls', 'requests_number')
@@ -0,0 +1,120 @@
+"""07_requests-partitions
+
+Revision ID: f419b44df765
+Revises: 5569d31fee4b
+Create Date: 2026-10-18 18:39:08.636018
+
+"""
+from datetime import date
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f419b44df765'
+down_revision = '5569d31fee4b'
+branch_labels = None
+depends_on = None
+
+# Months created ahead of the current one, the maintenance task keeps
+# this up afterwards.
+PREMAKE_MONTHS = 3
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def requests_columns(made_at_nullable: bool) -> list:
+    return [
+        sa.Column(
+            'id',
+            sa.Integer(),
+            server_default=sa.text("nextval('requests_id_seq'::regclass)"),
+            nullable=False
+        ),
+        sa.Column('url_id', sa.Integer(), nullable=True),
+        sa.Column('made_at', sa.DateTime(), nullable=made_at_nullable),
+        sa.Column('client_host', sa.String(), nullable=False),
+        sa.Column('client_port', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['url_id'], ['short_urls.id'], name='requests_url_id_fkey'
+        ),
+    ]
+
+
+def create_requests_indexes() -> None:
+    op.create_index('ix_requests_made_at', 'requests', ['made_at'])
+    op.create_index(
+        'ix_requests_url_id_made_at_id',
+        'requests',
+        ['url_id', 'made_at', 'id']
+    )
+
+
+def rename_requests(name: str) -> None:
+    op.rename_table('requests', name)
+    op.execute(f'ALTER INDEX requests_pkey RENAME TO {name}_pkey')
+    op.execute(f'ALTER INDEX ix_requests_made_at RENAME TO ix_{name}_made_at')
+    op.execute(
+        'ALTER INDEX ix_requests_url_id_made_at_id '
+        f'RENAME TO ix_{name}_url_id_made_at_id'
+    )
+    op.execute(
+        f'ALTER TABLE {name} RENAME CONSTRAINT requests_url_id_fkey '
+        f'TO {name}_url_id_fkey'
+    )
+
+
+def upgrade() -> None:
+    rename_requests('requests_unpartitioned')
+    op.create_table(
+        'requests',
+        *requests_columns(made_at_nullable=False),
+        sa.PrimaryKeyConstraint('id', 'made_at'),
+        postgresql_partition_by='RANGE (made_at)'
+    )
+    create_requests_indexes()
+    op.execute('ALTER SEQUENCE requests_id_seq OWNED BY requests.id')
+
+    first = op.get_bind().execute(sa.text(
+        'SELECT min(made_at) FROM requests_unpartitioned'
+    )).scalar() or date.today()
+    month = date(first.year, first.month, 1)
+    last = add_months(date.today().replace(day=1), PREMAKE_MONTHS)
+    while month <= last:
+        end = add_months(month, 1)
+        op.execute(
+            f'CREATE TABLE requests_y{month:%Y}m{month:%m} '
+            f"PARTITION OF requests FOR VALUES FROM ('{month}') TO ('{end}')"
+        )
+        month = end
+    # Rows without made_at cannot be routed to a partition.
+    op.execute(
+        'INSERT INTO requests '
+        '(id, url_id, made_at, client_host, client_port) '
+        'SELECT id, url_id, '
+        "coalesce(made_at, now() AT TIME ZONE 'utc'), client_host, client_port "
+        'FROM requests_unpartitioned'
+    )
+    op.drop_table('requests_unpartitioned')
+
+
+def downgrade() -> None:
+    rename_requests('requests_partitioned')
+    op.create_table(
+        'requests',
+        *requests_columns(made_at_nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    create_requests_indexes()
+    op.execute('ALTER SEQUENCE requests_id_seq OWNED BY requests.id')
+    op.execute(
+        'INSERT INTO requests '
+        '(id, url_id, made_at, client_host, client_port) '
+        'SELECT id, url_id, made_at, client_host, client_port '
+        'FROM requests_partitioned'
+    )
+    op.drop_table('requests_partitioned')
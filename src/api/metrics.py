@@ -0,0 +1,37 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.core.config import app_settings
+from src.core.logger import logging_stats
+from src.core.metrics import registry
+from src.db.db import engine, replica_set
+from src.services.urls_app import short_url_crud
+
+
+router = APIRouter()
+
+registry.add_collector('db_pool_', engine.pool.telemetry)
+registry.add_collector('log_queue_', logging_stats)
+registry.add_collector('db_replicas_', replica_set.stats)
+if short_url_crud.cache is not None:
+    registry.add_collector('redirect_cache_', short_url_crud.cache.stats)
+if short_url_crud.click_writer is not None:
+    registry.add_collector('click_writer_', short_url_crud.click_writer.stats)
+if short_url_crud.short_form_filter is not None:
+    registry.add_collector('bloom_', short_url_crud.short_form_filter.stats)
+if short_url_crud.shared_table is not None:
+    registry.add_collector('shared_table_', short_url_crud.shared_table.stats)
+if app_settings.storage_backend == 'log':
+    registry.add_collector('store_', short_url_crud.store.stats)
+
+
+@router.get(
+    '/metrics',
+    response_class=PlainTextResponse,
+    include_in_schema=False
+)
+async def get_metrics() -> str:
+    """
+    Get metrics in Prometheus text format.
+    """
+    return registry.render()
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
 
 from src.api.v1.short_url import router
+from src.api.v1.stats import router as stats_router
 
 
 api_router = APIRouter()
 
 api_router.include_router(router, prefix="/short_url", tags=["short_url"])
+api_router.include_router(stats_router, prefix="/stats", tags=["stats"])
@@ -1,20 +1,24 @@
-import logging.config
+import logging
+from datetime import datetime, timedelta
 from typing import Any, Optional, Union
 
-from fastapi import APIRouter, Depends, Query, Request, status
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.db import get_session
+from src.core.config import app_settings
+from src.db.db import get_read_session, get_session
 from src.schemas import short_url as short_url_schema
 from src.services.urls_app import short_url_crud
-from .tools import check_short_url
-from src.core.logger import LOGGING
+from .tools import (EXPORT_MEDIA_TYPES, check_batch_size, check_short_url,
+                    decode_cursor, encode_cursor, export_chunk,
+                    export_header, redirect_response, set_read_primary,
+                    status_page, to_utc_naive)
 
 router = APIRouter()
 
-logging.config.dictConfig(LOGGING)
 logger = logging.getLogger('api_logger')
+redirect_logger = logging.getLogger('api_logger.redirect')
 
 
 @router.get(
@@ -24,23 +28,42 @@ logger = logging.getLogger('api_logger')
 async def get_origin_url(
         *,
         db: AsyncSession = Depends(get_session),
+        read_db: AsyncSession = Depends(get_read_session),
         url_id: str,
         request: Request
 ) -> Any:
     """
     Get short URL by ID.
     """
-    short_url = await short_url_crud.get(db=db, url_id=url_id)
+    short_url = await short_url_crud.get_cached(db=read_db, url_id=url_id)
     check_short_url(short_url=short_url, url_id=url_id)
     result_object = await short_url_crud.add_request(
         db=db,
         obj=short_url,
         request=request
     )
-    logger.info(
+    redirect_logger.info(
         'Redirect from %s to %s', short_url.short_url, short_url.origin_url
     )
-    return RedirectResponse(result_object.origin_url)
+    return redirect_response(result_object, request.headers)
+
+
+@router.head(
+    '/{url_id}',
+    description='Headers of the redirect, without counting a click.'
+)
+async def head_origin_url(
+        *,
+        read_db: AsyncSession = Depends(get_read_session),
+        url_id: str,
+        request: Request
+) -> Any:
+    """
+    Check short URL by ID.
+    """
+    short_url = await short_url_crud.get_cached(db=read_db, url_id=url_id)
+    check_short_url(short_url=short_url, url_id=url_id)
+    return redirect_response(short_url, request.headers)
 
 
 @router.post(
@@ -53,11 +76,13 @@ async def create_short_url(
         *,
         db: AsyncSession = Depends(get_session),
         short_url_in: short_url_schema.ShortUrlCreate,
+        response: Response
 ) -> Any:
     """
     Create new short URL.
     """
     short_url = await short_url_crud.create(db=db, obj_in=short_url_in)
+    set_read_primary(response)
     logger.info(
         'Create short_url %s for %s', short_url.short_url, short_url.origin_url
     )
@@ -74,11 +99,16 @@ async def create_multi_short_urls(
         *,
         db: AsyncSession = Depends(get_session),
         short_urls_in: short_url_schema.MultiShortUrlCreate,
+        response: Response
 ) -> Any:
     """
     Create new short URLs.
     """
+    check_batch_size(
+        len(short_urls_in.__root__), app_settings.shorten_max_batch_size
+    )
     short_urls = await short_url_crud.create_multi(db=db, obj_in=short_urls_in)
+    set_read_primary(response)
     logger.info('Create a batch of short URLs')
     return short_urls
 
@@ -97,13 +127,39 @@ async def delete_short_url(
     """
     Delete a short URL.
     """
-    short_url = await short_url_crud.get(db=db, url_id=url_id)
-    check_short_url(short_url=short_url, url_id=url_id)
     short_url = await short_url_crud.delete(db=db, url_id=url_id)
+    if short_url is None:
+        # Nothing was marked: tell a missing link from a deleted one.
+        short_url = await short_url_crud.get_link(db=db, url_id=url_id)
+        check_short_url(short_url=short_url, url_id=url_id)
     logger.info('Short URL with url_id - %s - mark as deleted', url_id)
     return short_url
 
 
+@router.post(
+    '/bulk_delete',
+    response_model=short_url_schema.MultiShortUrlResponse,
+    description=('Mark a number of short URLs as "deleted". Return the '
+                 'ones that were live, unknown and deleted are skipped')
+)
+async def bulk_delete_short_urls(
+        *,
+        db: AsyncSession = Depends(get_session),
+        url_ids: short_url_schema.MultiShortUrlDelete
+) -> Any:
+    """
+    Delete short URLs.
+    """
+    check_batch_size(
+        len(url_ids.__root__), app_settings.shorten_max_batch_size
+    )
+    short_urls = await short_url_crud.delete_multi(
+        db=db, url_ids=url_ids.__root__
+    )
+    logger.info('Mark a batch of %s short URLs as deleted', len(short_urls))
+    return short_urls
+
+
 @router.get(
     '/{url_id}/status',
     response_model=Union[
@@ -112,7 +168,9 @@ async def delete_short_url(
     ],
     description=('Get status info of short URL. By default only'
                  ' requests number. Set "full-info" query '
-                 'parameter for more info.')
+                 'parameter for more info. Full info pages carry '
+                 'the cursor of the next page in "X-Next-Cursor". '
+                 'Clicks show up within CLICK_FLUSH_INTERVAL.')
 )
 async def get_short_url_status(
         *,
@@ -128,23 +186,113 @@ async def get_short_url_status(
             ge=0,
             description='Query offset.'
         ),
-        db: AsyncSession = Depends(get_session),
+        after: Optional[str] = Query(
+            default=None,
+            description='Cursor of the previous page, overrides offset.'
+        ),
+        db: AsyncSession = Depends(get_read_session),
         url_id: str
 ) -> Any:
     """
     Get URL status.
     """
-    short_url = await short_url_crud.get(db=db, url_id=url_id)
+    short_url = await short_url_crud.get_link(db=db, url_id=url_id)
     check_short_url(short_url=short_url, url_id=url_id)
     result = await short_url_crud.get_status(
         db=db,
         url_id=short_url.id,
         full_info=full_info,
         limit=max_size,
-        offset=offset
+        offset=offset,
+        after=decode_cursor(after) if after else None
     )
     if isinstance(result, int):
         logger.info('Send short version of status for url_id - %s', url_id)
         return JSONResponse(status_code=status.HTTP_200_OK, content={'requests_number': result})
+    # Rendered from the rows directly, the response model only documents it.
+    response = Response(
+        content=status_page(result), media_type='application/json'
+    )
+    if len(result) == max_size:
+        last = result[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last.made_at, last.id)
     logger.info('Send fill version of status for url_id - %s', url_id)
+    return response
+
+
+@router.get(
+    '/{url_id}/export',
+    response_class=StreamingResponse,
+    description=('Stream every request of short URL as NDJSON or CSV. '
+                 'Each row carries a cursor to resume the export with '
+                 'the "after" query parameter.')
+)
+async def export_short_url_requests(
+        *,
+        export_format: str = Query(
+            default='ndjson',
+            alias='format',
+            regex='^(ndjson|csv)$',
+            description='Export format.'
+        ),
+        after: Optional[str] = Query(
+            default=None,
+            description='Resume after the row with this cursor.'
+        ),
+        db: AsyncSession = Depends(get_read_session),
+        url_id: str
+) -> Any:
+    """
+    Export URL requests.
+    """
+    short_url = await short_url_crud.get_link(db=db, url_id=url_id)
+    check_short_url(short_url=short_url, url_id=url_id)
+    partitions = short_url_crud.stream_requests(
+        db=db,
+        url_id=short_url.id,
+        partition_size=app_settings.export_partition_size,
+        after=decode_cursor(after) if after else None
+    )
+
+    async def content():
+        yield export_header(export_format)
+        async for rows in partitions:
+            yield export_chunk(rows, export_format)
+
+    logger.info('Export requests for url_id - %s', url_id)
+    return StreamingResponse(
+        content(), media_type=EXPORT_MEDIA_TYPES[export_format]
+    )
+
+
+@router.get(
+    '/{url_id}/stats',
+    response_model=short_url_schema.ListRequestBucket,
+    description=('Get requests number of short URL per minute or hour '
+                 'bucket in [from, to). Defaults to the last 24 hours. '
+                 'Buckets are filled in the background with a short lag.')
+)
+async def get_short_url_stats(
+        *,
+        start: Optional[datetime] = Query(default=None, alias='from'),
+        end: Optional[datetime] = Query(default=None, alias='to'),
+        granularity: str = Query(default='hour', regex='^(minute|hour)$'),
+        db: AsyncSession = Depends(get_read_session),
+        url_id: str
+) -> Any:
+    """
+    Get URL requests stats.
+    """
+    short_url = await short_url_crud.get_link(db=db, url_id=url_id)
+    check_short_url(short_url=short_url, url_id=url_id)
+    end = to_utc_naive(end) if end else datetime.utcnow()
+    start = to_utc_naive(start) if start else end - timedelta(days=1)
+    result = await short_url_crud.get_rollups(
+        db=db,
+        url_id=short_url.id,
+        granularity=granularity,
+        start=start,
+        end=end
+    )
+    logger.info('Send %s stats for url_id - %s', granularity, url_id)
     return result
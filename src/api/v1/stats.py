@@ -0,0 +1,103 @@
+from typing import Any
+
+from fastapi import APIRouter
+
+from src.core.config import app_settings
+from src.db.db import engine, replica_set
+from src.services.urls_app import short_url_crud
+
+
+router = APIRouter()
+
+
+@router.get(
+    '/cache',
+    description='Redirect cache size and hit/miss/eviction counters.'
+)
+async def get_cache_stats() -> Any:
+    """
+    Get redirect cache stats.
+    """
+    if short_url_crud.cache is None:
+        return {}
+    return short_url_crud.cache.stats()
+
+
+@router.get(
+    '/clicks',
+    description='Write-behind click queue depth and written/dropped counters.'
+)
+async def get_click_stats() -> Any:
+    """
+    Get click writer stats.
+    """
+    if short_url_crud.click_writer is None:
+        return {}
+    return short_url_crud.click_writer.stats()
+
+
+@router.get(
+    '/bloom',
+    description=('Size, estimated false positive rate and rebuild time '
+                 'of the unknown short form filter.')
+)
+async def get_bloom_stats() -> Any:
+    """
+    Get short form filter stats.
+    """
+    if short_url_crud.short_form_filter is None:
+        return {}
+    return short_url_crud.short_form_filter.stats()
+
+
+@router.get(
+    '/pool',
+    description=('DB connection pool usage: checked out connections, time '
+                 'spent waiting for an idle connection, time spent opening '
+                 'new ones, overflow and timeouts.')
+)
+async def get_pool_stats() -> Any:
+    """
+    Get DB pool stats.
+    """
+    return engine.pool.telemetry()
+
+
+@router.get(
+    '/replicas',
+    description=('Read replicas: health, replication lag, checked out '
+                 'connections and reads that fell back to the primary.')
+)
+async def get_replica_stats() -> Any:
+    """
+    Get read replica stats.
+    """
+    return replica_set.stats()
+
+
+@router.get(
+    '/store',
+    description=('Log file store size, garbage records and compaction '
+                 'time when STORAGE_BACKEND is "log".')
+)
+async def get_store_stats() -> Any:
+    """
+    Get log file store stats.
+    """
+    if app_settings.storage_backend != 'log':
+        return {}
+    return short_url_crud.store.stats()
+
+
+@router.get(
+    '/shared_table',
+    description=('Shared memory redirect table: writer election, hot '
+                 'entries, hits and rebuild time of this worker.')
+)
+async def get_shared_table_stats() -> Any:
+    """
+    Get shared redirect table stats.
+    """
+    if short_url_crud.shared_table is None:
+        return {}
+    return short_url_crud.shared_table.stats()
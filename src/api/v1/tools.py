@@ -1,14 +1,34 @@
-import logging.config
-from fastapi import HTTPException, status
+import base64
+import binascii
+import csv
+import io
+import logging
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Mapping, Sequence, Tuple
+from urllib.parse import quote
 
+import orjson
+
+from fastapi import HTTPException, Response, status
+
+from src.core.config import app_settings
+from src.db.db import READ_PRIMARY_COOKIE, replica_set
 from src.models.urls_app import ShortUrl
-from src.core.logger import LOGGING
 
 
-logging.config.dictConfig(LOGGING)
 logger = logging.getLogger(__name__)
 
 
+EXPORT_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+EXPORT_FIELDS = ('cursor', 'made_at', 'client_host', 'client_port')
+# Same characters as starlette's RedirectResponse leaves unquoted.
+LOCATION_SAFE = ":/%#?=@[]!$&'()*+,;"
+
+
 def check_short_url(short_url: ShortUrl, url_id: str):
     if not short_url:
         logger.error('Raise 404 for url_id %s', url_id)
@@ -21,3 +41,161 @@ def check_short_url(short_url: ShortUrl, url_id: str):
         raise HTTPException(
             status_code=status.HTTP_410_GONE, detail='Item is deleted'
         )
+
+
+def check_batch_size(size: int, max_size: int):
+    if size > max_size:
+        logger.error('Raise 413 for batch of %s URLs', size)
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f'Batch is limited to {max_size} URLs'
+        )
+
+
+def encode_cursor(made_at: datetime, request_id: int) -> str:
+    raw = f'{made_at.isoformat()}|{request_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        made_at, request_id = raw.decode().split('|')
+        return datetime.fromisoformat(made_at), int(request_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        logger.error('Raise 400 for cursor %s', cursor)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor'
+        )
+
+
+def export_header(export_format: str) -> bytes:
+    if export_format != 'csv':
+        return b''
+    return (','.join(EXPORT_FIELDS) + '\r\n').encode()
+
+
+def export_chunk(rows: Sequence, export_format: str) -> bytes:
+    """Render request rows (id, made_at, client_host, client_port)."""
+    records = [
+        (
+            encode_cursor(row.made_at, row.id),
+            row.made_at.isoformat(),
+            None if row.client_host is None else str(row.client_host),
+            row.client_port,
+        )
+        for row in rows
+    ]
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        return buffer.getvalue().encode()
+    return b''.join(
+        orjson.dumps(dict(zip(EXPORT_FIELDS, record))) + b'\n'
+        for record in records
+    )
+
+
+def status_page(rows: Sequence) -> bytes:
+    """Render request rows as the JSON of ``ListRequest``."""
+    return orjson.dumps([
+        {
+            'made_at': row.made_at,
+            'client_host': (
+                None if row.client_host is None else str(row.client_host)
+            ),
+            'client_port': row.client_port,
+        }
+        for row in rows
+    ])
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def set_read_primary(response: Response) -> None:
+    """Send the client's reads to the primary until replicas catch up."""
+    if replica_set.replicas:
+        response.set_cookie(
+            READ_PRIMARY_COOKIE, '1',
+            max_age=app_settings.read_primary_window, httponly=True
+        )
+
+
+def redirect_policy(short_url: Any) -> Tuple[int, Dict[str, str]]:
+    """
+    Status and headers of the redirect to ``short_url``: its own status
+    and cache max-age or the configured ones, with an ETag and
+    Last-Modified derived from ``created_at``.
+    """
+    status_code = short_url.redirect_status or app_settings.redirect_status
+    max_age = short_url.cache_max_age
+    if max_age is None:
+        max_age = app_settings.redirect_cache_max_age
+    headers = {
+        'location': quote(str(short_url.origin_url), safe=LOCATION_SAFE),
+        'cache-control': f'public, max-age={max_age}' if max_age else 'no-cache',
+    }
+    if short_url.created_at is not None:
+        created_at = short_url.created_at.replace(
+            tzinfo=timezone.utc, microsecond=0
+        )
+        headers['etag'] = (
+            f'"{short_url.short_form}-{int(created_at.timestamp()):x}'
+            f'-{status_code}"'
+        )
+        headers['last-modified'] = format_datetime(created_at, usegmt=True)
+    return status_code, headers
+
+
+def not_modified(
+        request_headers: Mapping[str, str],
+        headers: Mapping[str, str]
+) -> bool:
+    """Whether the conditional request headers match the redirect."""
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match is not None:
+        etag = headers.get('etag')
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return etag is not None and (
+            '*' in tags or etag in tags or f'W/{etag}' in tags
+        )
+    if_modified_since = request_headers.get('if-modified-since')
+    last_modified = headers.get('last-modified')
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(last_modified) <= since
+
+
+def conditional_redirect(
+        short_url: Any,
+        request_headers: Mapping[str, str]
+) -> Tuple[int, Dict[str, str]]:
+    """
+    Status code and headers of the redirect to ``short_url``, or of a 304
+    without ``location`` when the conditional request headers match.
+    Shared by the routed endpoints and the redirect fast path.
+    """
+    status_code, headers = redirect_policy(short_url)
+    if not_modified(request_headers, headers):
+        del headers['location']
+        status_code = status.HTTP_304_NOT_MODIFIED
+    return status_code, headers
+
+
+def redirect_response(
+        short_url: Any,
+        request_headers: Mapping[str, str]
+) -> Response:
+    status_code, headers = conditional_redirect(short_url, request_headers)
+    return Response(status_code=status_code, headers=headers)
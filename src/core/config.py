@@ -1,24 +1,132 @@
 import os
-from logging import config as logging_config
+from typing import Dict, List, Optional, Tuple
 
-from pydantic import BaseSettings, PostgresDsn, Field
+from pydantic import BaseSettings, PostgresDsn, Field, validator
 
-from .logger import LOGGING
-
-
-logging_config.dictConfig(LOGGING)
+from .logger import setup_logging
 
 
 class AppSettings(BaseSettings):
     app_title: str = 'ShortUrlApp'
     database_dsn: PostgresDsn
+    db_echo: bool = Field(False, env='DB_ECHO')
+    db_pool_size: int = Field(5, env='DB_POOL_SIZE')
+    db_max_overflow: int = Field(10, env='DB_MAX_OVERFLOW')
+    db_pool_timeout: float = Field(30.0, env='DB_POOL_TIMEOUT')
+    db_pool_recycle: int = Field(-1, env='DB_POOL_RECYCLE')
+    db_pool_pre_ping: bool = Field(False, env='DB_POOL_PRE_PING')
+    db_pool_slow_checkout: float = Field(0.1, env='DB_POOL_SLOW_CHECKOUT')
+    db_statement_cache_size: int = Field(100, env='DB_STATEMENT_CACHE_SIZE')
+    # 'postgres' or 'log', the single-process append-only file store.
+    storage_backend: str = Field('postgres', env='STORAGE_BACKEND')
+    store_path: str = Field('shorturl.log', env='STORE_PATH')
+    store_fsync: bool = Field(False, env='STORE_FSYNC')
+    store_compact_interval: float = Field(3600.0, env='STORE_COMPACT_INTERVAL')
+    # Seconds to keep clicks for status and stats, None keeps all.
+    store_click_retention: Optional[float] = Field(
+        None, env='STORE_CLICK_RETENTION'
+    )
+    database_replica_dsns: List[PostgresDsn] = Field(
+        [], env='DATABASE_REPLICA_DSNS'
+    )
+    # 'round_robin' or 'least_connections'.
+    db_replica_strategy: str = Field('round_robin', env='DB_REPLICA_STRATEGY')
+    db_replica_max_lag: float = Field(5.0, env='DB_REPLICA_MAX_LAG')
+    db_replica_check_interval: float = Field(
+        5.0, env='DB_REPLICA_CHECK_INTERVAL'
+    )
+    # Reads go to the primary this long after the client created a link.
+    read_primary_window: int = Field(10, env='READ_PRIMARY_WINDOW')
     project_name: str = Field('ShortUrl', env='PROJECT_NAME')
     project_host: str = Field('127.0.0.1', env='PROJECT_HOST')
     project_port: int = Field(8080, env='PROJECT_PORT')
     base_dir: str = Field(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env='BASE_DIR')
+    blocked_hosts_file: Optional[str] = Field(None, env='BLOCKED_HOSTS_FILE')
+    blocked_hosts_reload_interval: float = Field(
+        5.0, env='BLOCKED_HOSTS_RELOAD_INTERVAL'
+    )
+    metrics_enabled: bool = Field(True, env='METRICS_ENABLED')
+    rate_limit_enabled: bool = Field(False, env='RATE_LIMIT_ENABLED')
+    # Route class ('redirect', 'create', 'other') -> (tokens per second, burst).
+    rate_limits: Dict[str, Tuple[float, float]] = Field(
+        {'redirect': (50, 100), 'create': (5, 20), 'other': (20, 40)},
+        env='RATE_LIMITS'
+    )
+    rate_limit_shards: int = Field(16, env='RATE_LIMIT_SHARDS')
+    # Must exceed burst / rate so evicted buckets would have been full.
+    rate_limit_idle_ttl: float = Field(60.0, env='RATE_LIMIT_IDLE_TTL')
+    redirect_fast_path: bool = Field(True, env='REDIRECT_FAST_PATH')
+    redirect_cache_size: int = Field(10000, env='REDIRECT_CACHE_SIZE')
+    redirect_cache_ttl: float = Field(60.0, env='REDIRECT_CACHE_TTL')
+    shared_table_enabled: bool = Field(False, env='SHARED_TABLE_ENABLED')
+    shared_table_path: str = Field(
+        '/dev/shm/shorturl-redirects', env='SHARED_TABLE_PATH'
+    )
+    # Power of two, at most half of the slots are filled.
+    shared_table_slots: int = Field(262144, env='SHARED_TABLE_SLOTS')
+    shared_table_heap_size: int = Field(
+        32 * 1024 * 1024, env='SHARED_TABLE_HEAP_SIZE'
+    )
+    shared_table_interval: float = Field(30.0, env='SHARED_TABLE_INTERVAL')
+    shared_table_hot_window: float = Field(
+        86400.0, env='SHARED_TABLE_HOT_WINDOW'
+    )
+    short_form_block_size: int = Field(100, env='SHORT_FORM_BLOCK_SIZE')
+    # Must stay below bloom_rebuild_interval, see ShortFormFilter.
+    short_form_block_ttl: float = Field(60.0, env='SHORT_FORM_BLOCK_TTL')
+    bloom_enabled: bool = Field(True, env='BLOOM_ENABLED')
+    bloom_capacity: int = Field(1000000, env='BLOOM_CAPACITY')
+    bloom_error_rate: float = Field(0.01, env='BLOOM_ERROR_RATE')
+    bloom_rebuild_interval: float = Field(300.0, env='BLOOM_REBUILD_INTERVAL')
+    # Rebuilds rescan links created this long before the previous scan.
+    bloom_scan_overlap: float = Field(60.0, env='BLOOM_SCAN_OVERLAP')
+    # Every row binds ~7 parameters and asyncpg allows 32767 per statement.
+    shorten_chunk_size: int = Field(1000, env='SHORTEN_CHUNK_SIZE')
+    shorten_max_batch_size: int = Field(10000, env='SHORTEN_MAX_BATCH_SIZE')
+    # Redirect policy of links created without their own.
+    redirect_status: int = Field(307, env='REDIRECT_STATUS')
+    redirect_cache_max_age: int = Field(0, env='REDIRECT_CACHE_MAX_AGE')
+    # Return the live link of an already shortened origin_url.
+    dedup_origin_urls: bool = Field(False, env='DEDUP_ORIGIN_URLS')
+    # Deleted links are hard-deleted after PURGE_GRACE_PERIOD seconds.
+    purge_grace_period: float = Field(
+        30 * 24 * 3600.0, env='PURGE_GRACE_PERIOD'
+    )
+    purge_interval: float = Field(3600.0, env='PURGE_INTERVAL')
+    purge_batch_size: int = Field(1000, env='PURGE_BATCH_SIZE')
+    purge_click_batch_size: int = Field(10000, env='PURGE_CLICK_BATCH_SIZE')
+    rollup_interval: float = Field(10.0, env='ROLLUP_INTERVAL')
+    rollup_batch_size: int = Field(50000, env='ROLLUP_BATCH_SIZE')
+    # Monthly partitions of requests created ahead and kept, None keeps all.
+    requests_partitions_ahead: int = Field(3, env='REQUESTS_PARTITIONS_AHEAD')
+    requests_retention_months: Optional[int] = Field(
+        None, env='REQUESTS_RETENTION_MONTHS'
+    )
+    partition_maintenance_interval: float = Field(
+        3600.0, env='PARTITION_MAINTENANCE_INTERVAL'
+    )
+    export_partition_size: int = Field(1000, env='EXPORT_PARTITION_SIZE')
+    click_batch_size: int = Field(500, env='CLICK_BATCH_SIZE')
+    click_flush_interval: float = Field(0.5, env='CLICK_FLUSH_INTERVAL')
+    click_queue_size: int = Field(10000, env='CLICK_QUEUE_SIZE')
+    log_json: bool = Field(False, env='LOG_JSON')
+    log_queue_size: int = Field(10000, env='LOG_QUEUE_SIZE')
+    log_sample_rates: Dict[str, float] = Field({}, env='LOG_SAMPLE_RATES')
+
+    @validator('redirect_status')
+    def redirect_status_is_redirect(cls, value):
+        # A Literal field would not coerce the env string.
+        if value not in (301, 302, 307, 308):
+            raise ValueError('must be one of 301, 302, 307, 308')
+        return value
 
     class Config:
         env_file = '.env'
 
 
 app_settings = AppSettings()
+setup_logging(
+    json_format=app_settings.log_json,
+    sample_rates=app_settings.log_sample_rates,
+    queue_size=app_settings.log_queue_size
+)
@@ -1,3 +1,16 @@
+import atexit
+import copy
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+import random
+from typing import Dict, Optional
+
+import orjson
+
+
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 LOG_DEFAULT_HANDLERS = ['console', ]
 
@@ -51,6 +64,9 @@ LOGGING = {
         'api_logger': {
             'level': 'INFO',
         },
+        'api_logger.redirect': {
+            'level': 'INFO',
+        },
         'tools': {
             'level': 'INFO',
         },
@@ -67,3 +83,157 @@ LOGGING = {
         'handlers': LOG_DEFAULT_HANDLERS,
     },
 }
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': self.formatTime(record),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return orjson.dumps(payload, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Let through about ``rate`` of the records of the logger it is attached to."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class _TargetQueueHandler(logging.handlers.QueueHandler):
+    """Queues records for the listener, tagged with the handler to use."""
+
+    dropped = 0
+
+    def __init__(self, log_queue: queue.Queue, target: str) -> None:
+        super().__init__(log_queue)
+        self.target = target
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep args: uvicorn formatters read them in the listener thread.
+        record = copy.copy(record)
+        record.queue_target = self.target
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _TargetQueueHandler.dropped += 1
+
+
+class _DispatchingQueueListener(logging.handlers.QueueListener):
+    def __init__(
+            self,
+            log_queue: queue.Queue,
+            targets: Dict[str, logging.Handler]
+    ) -> None:
+        super().__init__(log_queue)
+        self.targets = targets
+
+    def handle(self, record: logging.LogRecord) -> None:
+        handler = self.targets[record.queue_target]
+        if record.levelno >= handler.level:
+            handler.handle(record)
+
+
+_listener: Optional[_DispatchingQueueListener] = None
+
+
+def setup_logging(
+        json_format: bool = False,
+        sample_rates: Optional[Dict[str, float]] = None,
+        queue_size: int = 10000
+) -> None:
+    """
+    Apply LOGGING once and move handler I/O off the calling thread: every
+    configured handler is replaced by a QueueHandler and a QueueListener
+    thread writes the records. A full queue drops records instead of
+    blocking the event loop.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    config = copy.deepcopy(LOGGING)
+    if json_format:
+        config['formatters']['verbose'] = {'()': JsonFormatter}
+    logging.config.dictConfig(config)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    targets: Dict[str, logging.Handler] = {}
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+    for logger in loggers:
+        for handler in list(logger.handlers):
+            if isinstance(handler, _TargetQueueHandler):
+                continue
+            target = handler.name or str(id(handler))
+            targets[target] = handler
+            logger.removeHandler(handler)
+            logger.addHandler(_TargetQueueHandler(log_queue, target))
+    for name, rate in (sample_rates or {}).items():
+        logging.getLogger(name).addFilter(SamplingFilter(rate))
+
+    _listener = _DispatchingQueueListener(log_queue, targets)
+    _listener.start()
+    atexit.register(stop_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def _queue_handlers():
+    for logger in [logging.getLogger()] + list(
+        logging.Logger.manager.loggerDict.values()
+    ):
+        for handler in list(getattr(logger, 'handlers', [])):
+            if isinstance(handler, _TargetQueueHandler):
+                yield logger, handler
+
+
+def stop_logging() -> None:
+    """
+    Flush queued records, stop the listener thread and write later
+    records, e.g. uvicorn's shutdown messages, directly.
+    """
+    global _listener
+    if _listener is None:
+        return
+    if _listener._thread is not None:
+        _listener.stop()
+    for logger, handler in _queue_handlers():
+        logger.removeHandler(handler)
+        logger.addHandler(_listener.targets[handler.target])
+    _listener = None
+
+
+def logging_stats() -> dict:
+    if _listener is None:
+        return {'queued': 0, 'dropped': 0}
+    return {
+        'queued': _listener.queue.qsize(),
+        'dropped': _TargetQueueHandler.dropped,
+    }
+
+
+def _restart_in_child() -> None:
+    # The listener thread does not survive fork(), start a new one
+    # with a fresh queue.
+    global _listener
+    if _listener is None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=_listener.queue.maxsize)
+    for _, handler in _queue_handlers():
+        handler.queue = log_queue
+    _listener = _DispatchingQueueListener(log_queue, _listener.targets)
+    _listener.start()
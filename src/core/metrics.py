@@ -0,0 +1,152 @@
+import bisect
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+# Metrics are only touched from the event loop thread, so plain dict and
+# int updates are enough and no locks are taken on the request path.
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f'{self.name}{_labels(self.labelnames, labels)} {value}'
+            for labels, value in self._values.items()
+        ]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            help: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ('le',)
+        for labels, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _labels(names, labels + (bound,)), cumulative
+                ))
+            label_text = _labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {series[-1]}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List = []
+        self._collectors: List[Tuple[str, Callable[[], dict]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, prefix: str, collect: Callable[[], dict]) -> None:
+        """Export numeric values of ``collect()`` as ``<prefix><key>`` gauges."""
+        self._collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        for prefix, collect in self._collectors:
+            for key, value in collect().items():
+                if isinstance(value, (bool, int, float)):
+                    lines.append(f'# TYPE {prefix}{key} gauge')
+                    lines.append(f'{prefix}{key} {float(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route.',
+    ('method', 'route'),
+))
+http_requests = registry.register(Counter(
+    'http_requests_total',
+    'HTTP responses by route and status code.',
+    ('method', 'route', 'status'),
+))
+db_query_duration = registry.register(Histogram(
+    'db_query_duration_seconds',
+    'Time spent executing SQL statements.',
+    ('operation',),
+))
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every cursor execution of ``engine``."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info['query_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+    ):
+        started = conn.info.pop('query_started', None)
+        if started is None:
+            return
+        operation = (statement.split(None, 1) or ['?'])[0].upper()
+        db_query_duration.observe(
+            (operation,), time.perf_counter() - started
+        )
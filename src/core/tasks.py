@@ -0,0 +1,19 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(
+        job: Callable[[], Awaitable[Any]],
+        interval: float
+) -> None:
+    """Await ``job`` every ``interval`` seconds until cancelled."""
+    while True:
+        try:
+            await job()
+        except Exception:
+            logger.exception('Background job %s failed', job)
+        await asyncio.sleep(interval)
@@ -1,16 +1,82 @@
+from fastapi import Request
+from starlette.requests import HTTPConnection
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from src.core.config import app_settings
+from src.core.metrics import instrument_engine
+from .pool import InstrumentedAsyncPool
+from .replicas import Replica, ReplicaSet
 
 
+READ_PRIMARY_COOKIE = 'read_primary'
+READ_PRIMARY_HEADER = 'X-Read-Primary'
+
 Base = declarative_base()
-engine = create_async_engine(app_settings.database_dsn, echo=True, future=True)
+InstrumentedAsyncPool.slow_checkout = app_settings.db_pool_slow_checkout
+
+
+def create_engine(dsn: str):
+    engine = create_async_engine(
+        dsn,
+        echo=app_settings.db_echo,
+        future=True,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=app_settings.db_pool_size,
+        max_overflow=app_settings.db_max_overflow,
+        pool_timeout=app_settings.db_pool_timeout,
+        pool_recycle=app_settings.db_pool_recycle,
+        pool_pre_ping=app_settings.db_pool_pre_ping,
+        connect_args={
+            'prepared_statement_cache_size': app_settings.db_statement_cache_size
+        },
+    )
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+engine = create_engine(app_settings.database_dsn)
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+replica_set = ReplicaSet(
+    async_session,
+    [
+        Replica(
+            f'replica{index}',
+            replica_engine,
+            sessionmaker(
+                replica_engine, class_=AsyncSession, expire_on_commit=False
+            )
+        )
+        for index, replica_engine in enumerate(
+            create_engine(dsn) for dsn in app_settings.database_replica_dsns
+        )
+    ],
+    strategy=app_settings.db_replica_strategy,
+    max_lag=app_settings.db_replica_max_lag
+)
 
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+
+def read_session_factory(connection: HTTPConnection):
+    """
+    Session factory for read-only work on a replica. Clients that just
+    created a link (``read_primary`` cookie) or ask for it with
+    ``X-Read-Primary`` read from the primary.
+    """
+    if (
+        READ_PRIMARY_COOKIE in connection.cookies
+        or READ_PRIMARY_HEADER in connection.headers
+    ):
+        return async_session
+    return replica_set.session_factory()
+
+
+async def get_read_session(request: Request) -> AsyncSession:
+    async with read_session_factory(request)() as session:
+        yield session
@@ -0,0 +1,103 @@
+import logging
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.slow_checkouts = 0
+        self.overflows = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.connect_seconds_total = 0.0
+
+
+class TimedQueue(AsyncAdaptedQueue):
+    """Idle connection queue that reports how long each ``get`` waited."""
+
+    on_wait = None
+
+    def get(self, block=True, timeout=None):
+        started = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            if self.on_wait is not None:
+                self.on_wait(time.perf_counter() - started)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long each checkout waited for a connection,
+    how often it had to open an overflow connection and how often it timed
+    out. Waits above ``slow_checkout`` seconds are logged. The wait covers
+    only the idle connection queue; opening connections is reported
+    separately as ``connects``, and pre-ping is left out of both.
+    """
+
+    slow_checkout = 0.1
+    _queue_class = TimedQueue
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        self._pool.on_wait = self._record_wait
+
+    def connect(self):
+        self.stats.checkouts += 1
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+
+    def _record_wait(self, waited: float) -> None:
+        self.stats.wait_seconds_total += waited
+        if waited > self.stats.wait_seconds_max:
+            self.stats.wait_seconds_max = waited
+        if waited > self.slow_checkout:
+            self.stats.slow_checkouts += 1
+            logger.warning('Waited %.3fs for a DB connection', waited)
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            self.stats.connects += 1
+            self.stats.connect_seconds_total += time.perf_counter() - started
+
+    def _inc_overflow(self):
+        created = super()._inc_overflow()
+        if created and self._overflow > 0:
+            self.stats.overflows += 1
+        return created
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def telemetry(self) -> dict:
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': max(self.overflow(), 0),
+            'checkouts': self.stats.checkouts,
+            'wait_seconds_total': self.stats.wait_seconds_total,
+            'wait_seconds_max': self.stats.wait_seconds_max,
+            'slow_checkouts': self.stats.slow_checkouts,
+            'overflows': self.stats.overflows,
+            'timeouts': self.stats.timeouts,
+            'connects': self.stats.connects,
+            'connect_seconds_total': self.stats.connect_seconds_total,
+        }
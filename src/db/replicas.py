@@ -0,0 +1,118 @@
+import itertools
+import logging
+from typing import Any, Callable, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('round_robin', 'least_connections')
+
+# Zero when the replica has replayed everything it received, so an idle
+# primary does not look like replication lag.
+LAG_QUERY = text(
+    'SELECT CASE'
+    ' WHEN NOT pg_is_in_recovery()'
+    '  OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0'
+    ' ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)'
+    ' END'
+)
+
+
+class Replica:
+    def __init__(
+            self,
+            name: str,
+            engine: AsyncEngine,
+            session_factory: Callable[[], Any]
+    ) -> None:
+        self.name = name
+        self.engine = engine
+        self.session_factory = session_factory
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.ejections = 0
+
+    def checked_out(self) -> int:
+        return self.engine.pool.checkedout()
+
+
+class ReplicaSet:
+    """
+    Picks a session factory for read-only work: a healthy replica chosen
+    by ``strategy``, or the primary when no replica is healthy. ``check``
+    ejects replicas that fail a query or lag more than ``max_lag``
+    seconds behind and brings them back once they recover.
+    """
+
+    def __init__(
+            self,
+            primary: Callable[[], Any],
+            replicas: Sequence[Replica] = (),
+            strategy: str = 'round_robin',
+            max_lag: float = 5.0
+    ) -> None:
+        assert strategy in STRATEGIES, f'Unknown strategy {strategy}'
+        self.primary = primary
+        self.replicas: List[Replica] = list(replicas)
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self._counter = itertools.count()
+        self.primary_reads = 0
+
+    def choose(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == 'least_connections':
+            return min(healthy, key=Replica.checked_out)
+        return healthy[next(self._counter) % len(healthy)]
+
+    def session_factory(self) -> Callable[[], Any]:
+        replica = self.choose()
+        if replica is None:
+            self.primary_reads += 1
+            return self.primary
+        return replica.session_factory
+
+    async def check(self) -> None:
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as connection:
+                    results = await connection.execute(LAG_QUERY)
+                    replica.lag = float(results.scalar_one())
+                healthy = replica.lag <= self.max_lag
+            except Exception:
+                logger.warning(
+                    'Replica %s health check failed', replica.name,
+                    exc_info=True
+                )
+                replica.lag = None
+                healthy = False
+            if replica.healthy and not healthy:
+                replica.ejections += 1
+                logger.warning(
+                    'Replica %s ejected, lag %s', replica.name, replica.lag
+                )
+            elif healthy and not replica.healthy:
+                logger.info('Replica %s is back', replica.name)
+            replica.healthy = healthy
+
+    def stats(self) -> dict:
+        return {
+            'configured': len(self.replicas),
+            'healthy': sum(replica.healthy for replica in self.replicas),
+            'primary_reads': self.primary_reads,
+            'replicas': [
+                {
+                    'name': replica.name,
+                    'healthy': replica.healthy,
+                    'lag_seconds': replica.lag,
+                    'checked_out': replica.checked_out(),
+                    'ejections': replica.ejections,
+                }
+                for replica in self.replicas
+            ],
+        }
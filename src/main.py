@@ -1,9 +1,23 @@
+import asyncio
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
+from src.api import metrics
 from src.api.v1 import base
 from src.core.config import app_settings
+from src.core.logger import stop_logging
+from src.core.tasks import run_periodically
+from src.db.db import replica_set
+from src.middlewares.black_list import BlackListHostMiddleware
+from src.middlewares.fast_redirect import RedirectFastPathMiddleware
+from src.middlewares.metrics import MetricsMiddleware
+from src.middlewares.rate_limit import RateLimitMiddleware, TokenBucketStore
+from src.services.urls_app import (link_purger, listen_deleted_links,
+                                   maintain_shared_table, partition_manager,
+                                   rebuild_short_form_filter,
+                                   rollup_aggregator, short_url_crud)
 
 
 app = FastAPI(
@@ -14,6 +28,96 @@ app = FastAPI(
 )
 
 app.include_router(base.api_router, prefix="/api/v1")
+app.include_router(metrics.router)
+
+if app_settings.redirect_fast_path:
+    app.add_middleware(RedirectFastPathMiddleware)
+
+if app_settings.rate_limit_enabled:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limits=app_settings.rate_limits,
+        store=TokenBucketStore(
+            shards=app_settings.rate_limit_shards,
+            idle_ttl=app_settings.rate_limit_idle_ttl
+        )
+    )
+
+if app_settings.blocked_hosts_file:
+    app.add_middleware(
+        BlackListHostMiddleware,
+        blocked_hosts=[],
+        blocked_hosts_file=app_settings.blocked_hosts_file,
+        reload_interval=app_settings.blocked_hosts_reload_interval
+    )
+
+if app_settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+background_tasks: list[asyncio.Task] = []
+
+
+@app.on_event('startup')
+async def startup() -> None:
+    if app_settings.storage_backend == 'log':
+        # The rollup, filter and replica jobs all work on PostgreSQL.
+        background_tasks.append(asyncio.create_task(
+            run_periodically(
+                short_url_crud.compact, app_settings.store_compact_interval
+            )
+        ))
+        return
+    short_url_crud.click_writer.start()
+    background_tasks.append(asyncio.create_task(
+        run_periodically(
+            partition_manager.run, app_settings.partition_maintenance_interval
+        )
+    ))
+    background_tasks.append(asyncio.create_task(
+        run_periodically(link_purger.run, app_settings.purge_interval)
+    ))
+    background_tasks.append(asyncio.create_task(
+        run_periodically(
+            rollup_aggregator.run, app_settings.rollup_interval
+        )
+    ))
+    if short_url_crud.cache is not None and short_url_crud.cache.maxsize:
+        background_tasks.append(asyncio.create_task(listen_deleted_links()))
+    if short_url_crud.short_form_filter is not None:
+        background_tasks.append(asyncio.create_task(
+            run_periodically(
+                rebuild_short_form_filter,
+                app_settings.bloom_rebuild_interval
+            )
+        ))
+    if short_url_crud.shared_table is not None:
+        background_tasks.append(asyncio.create_task(
+            run_periodically(
+                maintain_shared_table, app_settings.shared_table_interval
+            )
+        ))
+    if replica_set.replicas:
+        background_tasks.append(asyncio.create_task(
+            run_periodically(
+                replica_set.check, app_settings.db_replica_check_interval
+            )
+        ))
+
+
+@app.on_event('shutdown')
+async def shutdown() -> None:
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    if short_url_crud.click_writer is not None:
+        await short_url_crud.click_writer.stop()
+    if short_url_crud.shared_table is not None:
+        await short_url_crud.shared_table.close()
+    if app_settings.storage_backend == 'log':
+        short_url_crud.store.close()
+    stop_logging()
+
 
 if __name__ == '__main__':
     uvicorn.run(
@@ -1,36 +1,125 @@
+import asyncio
+import os
+import time
 import typing
 from http import HTTPStatus
-import logging.config
+import logging
 
 from starlette.datastructures import Headers
 from starlette.responses import JSONResponse
 from starlette.types import ASGIApp, Receive, Scope, Send
 
-from src.core.logger import LOGGING
 
-
-logging.config.dictConfig(LOGGING)
 logger = logging.getLogger(__name__)
 
 ENFORCE_DOMAIN_WILDCARD = "Domain wildcard patterns must be like '*.example.com'."
 
+_WILDCARD = object()
+
+
+class HostMatcher:
+    """
+    Exact host names live in a set, '*.example.com' wildcards in a trie
+    keyed by reversed labels, so a lookup costs O(labels in host).
+    """
+
+    def __init__(self, patterns: typing.Iterable[str]) -> None:
+        self.block_any = False
+        self.exact: typing.Set[str] = set()
+        self.suffixes: dict = {}
+        self.size = 0
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str) -> None:
+        assert '*' not in pattern[1:], ENFORCE_DOMAIN_WILDCARD
+        pattern = pattern.lower()
+        self.size += 1
+        if pattern == '*':
+            self.block_any = True
+        elif pattern.startswith('*'):
+            assert pattern.startswith('*.'), ENFORCE_DOMAIN_WILDCARD
+            node = self.suffixes
+            for label in reversed(pattern[2:].split('.')):
+                node = node.setdefault(label, {})
+            node[_WILDCARD] = True
+        else:
+            self.exact.add(pattern)
+
+    def matches(self, host: str) -> bool:
+        if self.block_any or host in self.exact:
+            return True
+        node = self.suffixes
+        labels = host.split('.')
+        # A wildcard needs at least one label in front of its suffix.
+        for index in range(len(labels) - 1, 0, -1):
+            node = node.get(labels[index])
+            if node is None:
+                return False
+            if _WILDCARD in node:
+                return True
+        return False
+
+
+def read_blocked_hosts(path: str) -> typing.List[str]:
+    """One pattern per line; blank lines and '#' comments are skipped."""
+    with open(path, encoding='utf-8') as file:
+        return [
+            line for line in (raw.split('#', 1)[0].strip() for raw in file)
+            if line
+        ]
+
 
 class BlackListHostMiddleware:
     def __init__(
         self,
         app: ASGIApp,
-        blocked_hosts: typing.Optional[typing.Sequence[str]] = None
+        blocked_hosts: typing.Optional[typing.Sequence[str]] = None,
+        blocked_hosts_file: typing.Optional[str] = None,
+        reload_interval: float = 5.0
     ) -> None:
-        if blocked_hosts is None:
+        if blocked_hosts is None and blocked_hosts_file is None:
             blocked_hosts = ['*']
 
-        for pattern in blocked_hosts:
-            assert '*' not in pattern[1:], ENFORCE_DOMAIN_WILDCARD
-            if pattern.startswith('*') and pattern != '*':
-                assert pattern.startswith('*.'), ENFORCE_DOMAIN_WILDCARD
         self.app = app
-        self.blocked_hosts = list(blocked_hosts)
-        self.block_any = '*' in blocked_hosts
+        self.blocked_hosts = list(blocked_hosts or [])
+        self.blocked_hosts_file = blocked_hosts_file
+        self.reload_interval = reload_interval
+        self._mtime: typing.Optional[int] = None
+        self._next_check = 0.0
+        self._reloading = False
+        self._reload_task: typing.Optional[asyncio.Task] = None
+        patterns = self.blocked_hosts
+        if blocked_hosts_file is not None:
+            self._mtime = os.stat(blocked_hosts_file).st_mtime_ns
+            patterns = patterns + read_blocked_hosts(blocked_hosts_file)
+        self.matcher = HostMatcher(patterns)
+
+    async def reload(self) -> None:
+        """Rebuild the matcher if ``blocked_hosts_file`` has changed."""
+        try:
+            mtime = os.stat(self.blocked_hosts_file).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            patterns = await asyncio.to_thread(
+                read_blocked_hosts, self.blocked_hosts_file
+            )
+            matcher = await asyncio.to_thread(
+                HostMatcher, self.blocked_hosts + patterns
+            )
+        except (OSError, AssertionError):
+            logger.exception(
+                'Keep previous black list, reload of %s failed',
+                self.blocked_hosts_file
+            )
+        else:
+            self.matcher = matcher
+            self._mtime = mtime
+            logger.info(
+                'Black list reloaded with %s patterns', matcher.size
+            )
+        finally:
+            self._reloading = False
 
     async def __call__(
             self,
@@ -45,17 +134,17 @@ class BlackListHostMiddleware:
             await self.app(scope, receive, send)
             return
 
+        if self.blocked_hosts_file is not None and not self._reloading:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.reload_interval
+                self._reloading = True
+                self._reload_task = asyncio.create_task(self.reload())
+
         headers = Headers(scope=scope)
-        host = headers.get('host', '').split(':')[0]
-        is_valid_host = True
-        for pattern in self.blocked_hosts:
-            if host == pattern or (
-                pattern.startswith('*') and host.endswith(pattern[1:])
-            ):
-                is_valid_host = False
-                break
-
-        if is_valid_host:
+        host = headers.get('host', '').split(':')[0].lower()
+
+        if not self.matcher.matches(host):
             await self.app(scope, receive, send)
         else:
             response: JSONResponse = JSONResponse(
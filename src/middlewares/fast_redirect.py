@@ -0,0 +1,104 @@
+import orjson
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.api.v1.short_url import (get_origin_url, head_origin_url,
+                                  redirect_logger)
+from src.api.v1.tools import check_short_url, conditional_redirect
+from src.db.db import async_session, read_session_factory
+from src.services.urls_app import short_url_crud
+
+
+SHORT_URL_PREFIX = '/api/v1/short_url/'
+ENDPOINTS = {'GET': get_origin_url, 'HEAD': head_origin_url}
+
+EMPTY_BODY = {'type': 'http.response.body', 'body': b''}
+
+
+def _error_messages(status_code: int, detail: str) -> tuple:
+    body = orjson.dumps({'detail': detail})
+    return (
+        {
+            'type': 'http.response.start',
+            'status': status_code,
+            'headers': [
+                (b'content-length', str(len(body)).encode()),
+                (b'content-type', b'application/json'),
+            ],
+        },
+        {'type': 'http.response.body', 'body': body},
+    )
+
+
+ERRORS = {
+    404: _error_messages(404, 'Item not found'),
+    410: _error_messages(410, 'Item is deleted'),
+}
+
+
+class RedirectFastPathMiddleware:
+    """
+    Serves ``GET`` and ``HEAD /api/v1/short_url/{url_id}`` without FastAPI
+    routing and dependency injection, with the same lookup, click logging,
+    redirect policy and 404/410 responses as ``get_origin_url`` and
+    ``head_origin_url``. Everything else falls through.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+            self,
+            scope: Scope,
+            receive: Receive,
+            send: Send
+    ) -> None:
+        path = scope.get('path', '')
+        if (
+            scope['type'] != 'http'
+            or scope['method'] not in ENDPOINTS
+            or not path.startswith(SHORT_URL_PREFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+        url_id = path[len(SHORT_URL_PREFIX):]
+        if not url_id or '/' in url_id:
+            await self.app(scope, receive, send)
+            return
+
+        # Keeps the metrics route label of the regular endpoint.
+        scope['endpoint'] = ENDPOINTS[scope['method']]
+        request = Request(scope)
+        async with read_session_factory(request)() as read_db:
+            short_url = await short_url_crud.get_cached(
+                db=read_db, url_id=url_id
+            )
+        try:
+            check_short_url(short_url=short_url, url_id=url_id)
+        except HTTPException as exc:
+            start, body = ERRORS[exc.status_code]
+            await send(start)
+            await send(body)
+            return
+        if scope['method'] == 'GET':
+            async with async_session() as db:
+                await short_url_crud.add_request(
+                    db=db, obj=short_url, request=request
+                )
+            redirect_logger.info(
+                'Redirect from %s to %s',
+                short_url.short_url, short_url.origin_url
+            )
+        status_code, headers = conditional_redirect(
+            short_url, request.headers
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': status_code,
+            'headers': [(b'content-length', b'0')] + [
+                (name.encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        })
+        await send(EMPTY_BODY)
@@ -0,0 +1,61 @@
+import time
+import typing
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.metrics import http_request_duration, http_requests
+
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class MetricsMiddleware:
+    """
+    Records latency and status code per route template. The router stores
+    the matched endpoint in the scope, which is mapped back to its path.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._routes: typing.Dict[typing.Callable, str] = {}
+
+    def _route(self, scope: Scope) -> str:
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        route = self._routes.get(endpoint)
+        if route is None:
+            for app_route in scope['app'].routes:
+                if getattr(app_route, 'endpoint', None) is not None:
+                    self._routes[app_route.endpoint] = app_route.path
+            route = self._routes.setdefault(endpoint, UNMATCHED_ROUTE)
+        return route
+
+    async def __call__(
+            self,
+            scope: Scope,
+            receive: Receive,
+            send: Send
+    ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route(scope)
+            method = scope['method']
+            http_request_duration.observe(
+                (method, route), time.perf_counter() - started
+            )
+            http_requests.inc((method, route, status_code))
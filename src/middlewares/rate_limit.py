@@ -0,0 +1,127 @@
+import math
+import time
+import typing
+from http import HTTPStatus
+import logging
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+logger = logging.getLogger(__name__)
+
+SHORT_URL_PREFIX = '/api/v1/short_url/'
+
+
+def route_class(method: str, path: str) -> str:
+    if path.startswith(SHORT_URL_PREFIX):
+        if method == 'POST':
+            return 'create'
+        if method in ('GET', 'HEAD') and '/' not in path[len(SHORT_URL_PREFIX):]:
+            return 'redirect'
+    return 'other'
+
+
+class TokenBucketStore:
+    """
+    Token buckets stored as ``[tokens, updated_at]`` lists in ``shards``
+    dicts. Each ``sweep_interval`` one shard is swept for buckets idle
+    longer than ``idle_ttl``, so eviction cost is spread over requests.
+    """
+
+    def __init__(
+            self,
+            shards: int = 16,
+            idle_ttl: float = 60.0,
+            sweep_interval: float = 1.0,
+            timer: typing.Callable[[], float] = time.monotonic
+    ) -> None:
+        self._shards: typing.List[dict] = [{} for _ in range(shards)]
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._timer = timer
+        self._next_sweep = timer() + sweep_interval
+        self._sweep_shard = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def take(self, key: typing.Hashable, rate: float, burst: float) -> float:
+        """Take one token. Return 0 on success or seconds until one is available."""
+        now = self._timer()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        shard = self._shards[hash(key) % len(self._shards)]
+        bucket = shard.get(key)
+        if bucket is None:
+            shard[key] = [burst - 1, now]
+            return 0.0
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    def _sweep(self, now: float) -> None:
+        self._next_sweep = now + self.sweep_interval
+        shard = self._shards[self._sweep_shard]
+        self._sweep_shard = (self._sweep_shard + 1) % len(self._shards)
+        idle = [
+            key for key, bucket in shard.items()
+            if now - bucket[1] > self.idle_ttl
+        ]
+        for key in idle:
+            del shard[key]
+        self.evictions += len(idle)
+
+
+class RateLimitMiddleware:
+    """
+    Per client IP and route class token-bucket limiter. ``limits`` maps a
+    route class ('redirect', 'create', 'other') to ``(rate, burst)``;
+    classes without limits pass through.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limits: typing.Mapping[str, typing.Tuple[float, float]],
+        store: typing.Optional[TokenBucketStore] = None
+    ) -> None:
+        self.app = app
+        self.limits = dict(limits)
+        self.store = store or TokenBucketStore()
+
+    async def __call__(
+            self,
+            scope: Scope,
+            receive: Receive,
+            send: Send
+    ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        kind = route_class(scope['method'], scope['path'])
+        limit = self.limits.get(kind)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get('client')
+        retry_after = self.store.take(
+            (client[0] if client else '', kind), *limit
+        )
+        if not retry_after:
+            await self.app(scope, receive, send)
+        else:
+            logger.debug('Rate limit for %s on %s', client, kind)
+            response: JSONResponse = JSONResponse(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS,
+                content={'error': 'Too many requests'},
+                headers={'Retry-After': str(math.ceil(retry_after))}
+            )
+            await response(scope, receive, send)
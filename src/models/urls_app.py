@@ -1,27 +1,97 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, ForeignKey,
+                        Index, Integer, Sequence, SmallInteger, String,
+                        literal, text)
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from sqlalchemy_utils import URLType
 
+from src.core.config import app_settings
 from src.db.db import Base
 
 
+short_form_seq = Sequence('short_form_seq', metadata=Base.metadata)
+
+
+def build_short_url(short_form: str) -> str:
+    return ''.join(
+        [
+            'http://',
+            app_settings.project_host,
+            ':',
+            str(app_settings.project_port),
+            '/api/v1/short_url/',
+            short_form
+        ])
+
+
 class Request(Base):
     __tablename__ = "requests"
-    id = Column(Integer, primary_key=True)
+    # made_at is the partition key, so it is part of the primary key.
+    id = Column(Integer, primary_key=True, autoincrement=True)
     url_id = Column(Integer, ForeignKey('short_urls.id'))
-    made_at = Column(DateTime, index=True, default=datetime.utcnow)
-    client_host = Column(String, nullable=False)
+    made_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    # NULL for clients that are not IP addresses, e.g. unix sockets.
+    client_host = Column(INET)
     client_port = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        Index('ix_requests_url_id_made_at_id', 'url_id', 'made_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (made_at)'},
+    )
+
 
 class ShortUrl(Base):
     __tablename__ = "short_urls"
     id = Column(Integer, primary_key=True)
     origin_url = Column(URLType, nullable=False)
-    short_url = Column(URLType,  nullable=False)
     created_at = Column(DateTime, index=True, default=datetime.utcnow)
     requests = relationship('Request', backref='url', cascade="all, delete")
-    short_form = Column(String(6), nullable=False)
+    short_form = Column(String(6), nullable=False, unique=True, index=True)
     deleted = Column(Boolean, default=False)
+    deleted_at = Column(DateTime)
+    requests_number = Column(
+        Integer, nullable=False, default=0, server_default='0'
+    )
+    # Hash of the normalized origin_url, see services.dedup.
+    origin_hash = Column(BigInteger, index=True)
+    # Redirect policy of the link, None falls back to the settings.
+    redirect_status = Column(SmallInteger)
+    cache_max_age = Column(Integer)
+
+    __table_args__ = (
+        Index(
+            'ix_short_urls_deleted_at',
+            'deleted_at',
+            postgresql_where=text('deleted')
+        ),
+    )
+
+    # Derived from short_form and the settings instead of being stored.
+    @hybrid_property
+    def short_url(self) -> str:
+        return build_short_url(self.short_form)
+
+    @short_url.expression
+    def short_url(cls):
+        return (literal(build_short_url('')) + cls.short_form).label(
+            'short_url'
+        )
+
+
+class RequestRollup(Base):
+    __tablename__ = "request_rollups"
+    url_id = Column(
+        Integer, ForeignKey('short_urls.id'), primary_key=True
+    )
+    granularity = Column(String(6), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    requests_number = Column(Integer, nullable=False, default=0)
+
+
+class RollupState(Base):
+    __tablename__ = "rollup_state"
+    id = Column(Integer, primary_key=True)
+    last_request_id = Column(Integer, nullable=False, default=0)
@@ -1,14 +1,19 @@
 from datetime import datetime
-from typing import List, Union
+from typing import List, Literal, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conint, validator
 
 
 class Request(BaseModel):
     made_at: datetime
-    client_host: str
+    client_host: Optional[str]
     client_port: int
 
+    @validator('client_host', pre=True)
+    def client_host_to_str(cls, value):
+        # INET values arrive as ipaddress objects.
+        return None if value is None else str(value)
+
     class Config:
         orm_mode = True
 
@@ -22,8 +27,22 @@ class RequestCount(BaseModel):
     requests_number: int
 
 
+class RequestBucket(BaseModel):
+    bucket: datetime
+    requests_number: int
+
+    class Config:
+        orm_mode = True
+
+
+class ListRequestBucket(BaseModel):
+    __root__: List[RequestBucket]
+
+
 class ShortUrlBase(BaseModel):
     origin_url: str
+    redirect_status: Optional[Literal[301, 302, 307, 308]] = None
+    cache_max_age: Optional[conint(ge=0)] = None
 
 
 class ShortUrlResponse(BaseModel):
@@ -54,6 +73,10 @@ class MultiShortUrlCreate(BaseModel):
     __root__: List[ShortUrlBase]
 
 
+class MultiShortUrlDelete(BaseModel):
+    __root__: List[str]
+
+
 class ShortUrl(ShortUrlBase):
     description: Union[str, None] = None
     id: int
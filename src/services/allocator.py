@@ -0,0 +1,94 @@
+import string
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+from sqlalchemy import Sequence, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+CODE_LENGTH = 6
+# Legacy codes were random shortuuid strings, whose alphabet never contains
+# these characters, so leading with one of them keeps both sets disjoint.
+PREFIXES = '01IOl'
+TAIL_SPACE = len(ALPHABET) ** (CODE_LENGTH - 1)
+CAPACITY = len(PREFIXES) * TAIL_SPACE
+# Affine permutation of [0, CAPACITY) so consecutive sequence values do not
+# produce consecutive codes. MULTIPLIER must be coprime with CAPACITY.
+MULTIPLIER = 2654435761
+OFFSET = 1500450271
+INVERSE = pow(MULTIPLIER, -1, CAPACITY)
+_INDEX = {char: index for index, char in enumerate(ALPHABET)}
+
+
+def encode(number: int) -> str:
+    if not 0 < number < CAPACITY:
+        raise ValueError(f'Short form space exhausted at {number}')
+    value = (number * MULTIPLIER + OFFSET) % CAPACITY
+    prefix, value = divmod(value, TAIL_SPACE)
+    tail = []
+    for _ in range(CODE_LENGTH - 1):
+        value, digit = divmod(value, len(ALPHABET))
+        tail.append(ALPHABET[digit])
+    return PREFIXES[prefix] + ''.join(reversed(tail))
+
+
+def decode(code: str) -> Optional[int]:
+    """Sequence number behind ``code``, or None if ``encode`` cannot produce it."""
+    if len(code) != CODE_LENGTH or code[0] not in PREFIXES:
+        return None
+    value = PREFIXES.index(code[0])
+    for char in code[1:]:
+        digit = _INDEX.get(char)
+        if digit is None:
+            return None
+        value = value * len(ALPHABET) + digit
+    number = (value - OFFSET) * INVERSE % CAPACITY
+    return number or None
+
+
+class ShortFormAllocator:
+    """
+    Hands out unique short forms by encoding values of a DB sequence.
+    Values are reserved ``block_size`` at a time in one round trip and
+    unused ones are dropped ``block_ttl`` seconds after the reservation,
+    so every code is inserted soon after its value left the sequence.
+    """
+
+    def __init__(
+            self,
+            sequence: Sequence,
+            block_size: int,
+            block_ttl: float = 60.0,
+            timer: Callable[[], float] = time.monotonic
+    ) -> None:
+        self._sequence = sequence
+        self.block_size = block_size
+        self.block_ttl = block_ttl
+        self._timer = timer
+        self._reserved: Deque[int] = deque()
+        self._expires_at = 0.0
+
+    async def _reserve(self, db: AsyncSession, count: int) -> None:
+        statement = select(
+            self._sequence.next_value()
+        ).select_from(
+            func.generate_series(1, count)
+        )
+        reserved_at = self._timer()
+        results = await db.execute(statement=statement)
+        if self._timer() >= self._expires_at:
+            self._reserved.clear()
+        if not self._reserved:
+            self._expires_at = reserved_at + self.block_ttl
+        self._reserved.extend(results.scalars().all())
+
+    async def allocate(self, db: AsyncSession, count: int = 1) -> List[str]:
+        if self._timer() >= self._expires_at:
+            self._reserved.clear()
+        while len(self._reserved) < count:
+            await self._reserve(
+                db, max(self.block_size, count - len(self._reserved))
+            )
+        return [encode(self._reserved.popleft()) for _ in range(count)]
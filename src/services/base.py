@@ -1,19 +1,49 @@
-from typing import Any, Generic, Optional, Type, TypeVar, Union
+import asyncio
+import logging
+from datetime import datetime
+from typing import (Any, AsyncIterator, Collection, Dict, Generic, List,
+                    Optional, Tuple, Type, TypeVar, Union)
 
-import shortuuid
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import (String, bindparam, func, insert, text, tuple_,
+                        type_coerce, update)
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from fastapi import Request as ClientRequest
 from sqlalchemy.future import select
 
-from src.core.config import app_settings
 from src.db.db import Base
+from src.models.urls_app import build_short_url
+from .allocator import ShortFormAllocator
+from .bloom import ShortFormFilter
+from .cache import CachedShortUrl, LRUCache
+from .clicks import (FENCE_LOCK_ID, ClickEvent, ClickWriter,
+                     counter_statement, inet_host)
+from .dedup import normalize_url, origin_hash
+from .shared_table import DELETE_CHANNEL, SharedRedirectTable
+
+
+logger = logging.getLogger(__name__)
+
+# Tells the redirect caches and shared tables of all workers which codes
+# were deleted.
+NOTIFY_DELETED = text(
+    'SELECT pg_notify(:channel, short_form) '
+    'FROM unnest(CAST(:short_forms AS text[])) AS short_form'
+)
+# Serialises creation of links for the same origins, sorted against
+# deadlocks between overlapping batches.
+LOCK_ORIGINS = text(
+    'SELECT pg_advisory_xact_lock(hash) FROM '
+    '(SELECT unnest(CAST(:hashes AS bigint[])) AS hash ORDER BY hash) '
+    'AS origins'
+)
 
 
 class Repository:
 
-    def get(self, *args, **kwargs):
+    def get_link(self, *args, **kwargs):
         raise NotImplementedError
 
     def get_status(self, *args, **kwargs):
@@ -31,6 +61,9 @@ class Repository:
     def delete(self, *args, **kwargs):
         raise NotImplementedError
 
+    def delete_multi(self, *args, **kwargs):
+        raise NotImplementedError
+
 
 ModelType = TypeVar("ModelType", bound=Base)
 RequestTypeModel = TypeVar("RequestTypeModel", bound=Base)
@@ -50,23 +83,89 @@ class RepositoryShotUrlDB(
     def __init__(
             self,
             model: Type[ModelType],
-            request: Type[ModelType]
+            request: Type[ModelType],
+            allocator: ShortFormAllocator,
+            rollup: Optional[Type[Base]] = None,
+            chunk_size: int = 1000,
+            cache: Optional[LRUCache] = None,
+            click_writer: Optional[ClickWriter] = None,
+            short_form_filter: Optional[ShortFormFilter] = None,
+            shared_table: Optional[SharedRedirectTable] = None,
+            dedup: bool = False
     ):
         self._model = model
         self._request_model = request
+        self.allocator = allocator
+        self._rollup_model = rollup
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.click_writer = click_writer
+        self.short_form_filter = short_form_filter
+        self.shared_table = shared_table
+        self.dedup = dedup
+        table = model.__table__
+        # Plain column tuples: no identity map, and origin_url is read as
+        # text instead of being parsed by URLType.
+        self._link_statement = select(
+            table.c.id,
+            type_coerce(table.c.origin_url, String),
+            table.c.short_form,
+            table.c.deleted,
+            table.c.created_at,
+            table.c.redirect_status,
+            table.c.cache_max_age
+        ).where(
+            table.c.short_form == bindparam('url_id')
+        )
 
-    async def get(
+    async def get_link(
             self,
             db: AsyncSession,
             url_id: Any
-    ) -> Optional[ModelType]:
-        statement = select(
-            self._model
-        ).where(
-            self._model.short_form == url_id
+    ) -> Optional[CachedShortUrl]:
+        """Fields of the redirect and the existence checks, without ORM."""
+        results = await db.execute(self._link_statement, {'url_id': url_id})
+        row = results.first()
+        if row is None:
+            return None
+        (
+            link_id, origin_url, short_form, deleted,
+            created_at, redirect_status, cache_max_age
+        ) = row
+        return CachedShortUrl(
+            link_id, origin_url, build_short_url(short_form), short_form,
+            bool(deleted), created_at, redirect_status, cache_max_age
         )
-        results = await db.execute(statement=statement)
-        return results.scalar_one_or_none()
+
+    async def get_cached(
+            self,
+            db: AsyncSession,
+            url_id: Any
+    ) -> Optional[CachedShortUrl]:
+        # The shared table goes first: its delete flags reach every worker.
+        if self.shared_table is not None:
+            shared = self.shared_table.lookup(url_id)
+            if shared is not None:
+                return CachedShortUrl(
+                    shared.id, shared.origin_url, build_short_url(url_id),
+                    url_id, shared.deleted, shared.created_at,
+                    shared.redirect_status, shared.cache_max_age
+                )
+        if self.cache is not None:
+            cached = self.cache.get(url_id)
+            if cached is not None:
+                return cached
+        if (
+            self.short_form_filter is not None
+            and self.short_form_filter.is_absent(url_id)
+        ):
+            return None
+        cached = await self.get_link(db, url_id)
+        if cached is None:
+            return None
+        if self.cache is not None:
+            self.cache.set(url_id, cached)
+        return cached
 
     async def get_status(
             self,
@@ -75,40 +174,138 @@ class RepositoryShotUrlDB(
             limit: int,
             offset: int,
             full_info: Optional[bool],
-    ) -> Union[int, list[ModelType]]:
+            after: Optional[tuple[datetime, int]] = None,
+    ) -> Union[int, list[Row]]:
         if not full_info:
             statement = select(
-                self._request_model
+                self._model.requests_number
             ).where(
-                self._request_model.url_id == url_id
+                self._model.id == url_id
             )
             results = await db.execute(statement=statement)
-            requests_number = len(results.fetchall())
-            return requests_number
+            return results.scalar_one()
+        requests = self._request_model.__table__
         statement = select(
-            self._request_model
+            requests.c.id,
+            requests.c.made_at,
+            requests.c.client_host,
+            requests.c.client_port
         ).where(
-            self._request_model.url_id == url_id
-        ).offset(offset).limit(limit)
+            requests.c.url_id == url_id
+        ).order_by(
+            requests.c.made_at, requests.c.id
+        )
+        if after is not None:
+            statement = statement.where(
+                tuple_(requests.c.made_at, requests.c.id) > tuple_(*after)
+            )
+        else:
+            statement = statement.offset(offset)
+        results = await db.execute(statement=statement.limit(limit))
+        return results.all()
+
+    async def get_rollups(
+            self,
+            db: AsyncSession,
+            url_id: Any,
+            granularity: str,
+            start: datetime,
+            end: datetime,
+    ) -> list[Row]:
+        statement = select(
+            self._rollup_model.bucket,
+            self._rollup_model.requests_number
+        ).where(
+            self._rollup_model.url_id == url_id,
+            self._rollup_model.granularity == granularity,
+            self._rollup_model.bucket >= start,
+            self._rollup_model.bucket < end
+        ).order_by(
+            self._rollup_model.bucket
+        )
         results = await db.execute(statement=statement)
-        return results.scalars().all()
+        return results.all()
+
+    async def stream_requests(
+            self,
+            db: AsyncSession,
+            url_id: Any,
+            partition_size: int,
+            after: Optional[tuple[datetime, int]] = None,
+    ) -> AsyncIterator[list[Row]]:
+        statement = select(
+            self._request_model.id,
+            self._request_model.made_at,
+            self._request_model.client_host,
+            self._request_model.client_port,
+        ).where(
+            self._request_model.url_id == url_id
+        ).order_by(
+            self._request_model.made_at, self._request_model.id
+        )
+        if after is not None:
+            statement = statement.where(
+                tuple_(
+                    self._request_model.made_at, self._request_model.id
+                ) > tuple_(*after)
+            )
+        results = await db.stream(
+            statement.execution_options(yield_per=partition_size)
+        )
+        async for partition in results.partitions(partition_size):
+            yield partition
 
-    def create_obj(self, obj_in_data):
+    def create_values(self, obj_in_data, short_form):
         extra_obj_info = {}
-        short_form = shortuuid.ShortUUID().random(length=6)
         extra_obj_info['short_form'] = short_form
-        short_url = ''.join(
-            [
-                'http://',
-                app_settings.project_host,
-                ':',
-                str(app_settings.project_port),
-                '/api/v1/short_url/',
-                short_form
-            ])
-        extra_obj_info['short_url'] = short_url
+        extra_obj_info['origin_hash'] = origin_hash(obj_in_data['origin_url'])
         obj_in_data.update(extra_obj_info)
-        return self._model(**obj_in_data)
+        return obj_in_data
+
+    def create_obj(self, obj_in_data, short_form):
+        return self._model(**self.create_values(obj_in_data, short_form))
+
+    @staticmethod
+    def dedup_key(obj_in_data: dict) -> Tuple[str, Any, Any]:
+        """The normalized origin URL and the redirect policy of a link."""
+        return (
+            normalize_url(obj_in_data['origin_url']),
+            obj_in_data.get('redirect_status'),
+            obj_in_data.get('cache_max_age')
+        )
+
+    async def find_existing(
+            self,
+            db: AsyncSession,
+            keys: Collection[Tuple[str, Any, Any]]
+    ) -> Dict[Tuple[str, Any, Any], Row]:
+        """
+        Lock the origin URLs of the ``dedup_key`` values ``keys`` until
+        commit and return the live links already created with the same
+        origin and redirect policy, by one index lookup.
+        """
+        hashes = sorted({origin_hash(origin) for origin, *_ in keys})
+        await db.execute(LOCK_ORIGINS, {'hashes': hashes})
+        statement = select(
+            *self._model.__table__.columns, self._model.short_url
+        ).where(
+            self._model.origin_hash.in_(hashes),
+            self._model.deleted.isnot(True)
+        ).order_by(
+            self._model.id
+        )
+        results = await db.execute(statement=statement)
+        existing = {}
+        for row in results:
+            # Comparing the URLs rules out hash collisions.
+            key = (
+                normalize_url(str(row.origin_url)),
+                row.redirect_status,
+                row.cache_max_age
+            )
+            if key in keys:
+                existing.setdefault(key, row)
+        return existing
 
     async def create(
             self,
@@ -117,10 +314,19 @@ class RepositoryShotUrlDB(
             obj_in: CreateSchemaType
     ) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
-        db_obj = self.create_obj(obj_in_data)
+        if self.dedup:
+            key = self.dedup_key(obj_in_data)
+            existing = await self.find_existing(db, {key})
+            if key in existing:
+                await db.commit()
+                return existing[key]
+        short_form, = await self.allocator.allocate(db)
+        db_obj = self.create_obj(obj_in_data, short_form)
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
+        if self.short_form_filter is not None:
+            self.short_form_filter.add(short_form)
         return db_obj
 
     async def create_multi(
@@ -128,43 +334,176 @@ class RepositoryShotUrlDB(
             db: AsyncSession,
             *,
             obj_in: MultiCreateSchemaType
-    ) -> ModelType:
+    ) -> list[Row]:
         objs_in_data = jsonable_encoder(obj_in)
-        objects_to_db = [
-            self.create_obj(obj_in_data)
-            for obj_in_data in objs_in_data
+        if self.dedup:
+            return await self.create_multi_deduplicated(db, objs_in_data)
+        short_forms = await self.allocator.allocate(db, len(objs_in_data))
+        values = [
+            self.create_values(obj_in_data, short_form)
+            for obj_in_data, short_form in zip(objs_in_data, short_forms)
         ]
-        db.add_all(objects_to_db)
-        await db.commit()
-        for obj in objects_to_db:
-            await db.refresh(obj)
-        return objects_to_db
+        created = []
+        for start in range(0, len(values), self.chunk_size):
+            statement = insert(
+                self._model
+            ).values(
+                values[start:start + self.chunk_size]
+            ).returning(
+                *self._model.__table__.columns, self._model.short_url
+            )
+            results = await db.execute(statement=statement)
+            created.extend(results.all())
+            await db.commit()
+        if self.short_form_filter is not None:
+            for short_form in short_forms:
+                self.short_form_filter.add(short_form)
+        return created
+
+    async def create_multi_deduplicated(
+            self,
+            db: AsyncSession,
+            objs_in_data: List[dict]
+    ) -> List[Row]:
+        """
+        Insert only the origins of each chunk without a live link of the
+        same redirect policy, the same origin and policy repeated in the
+        batch gets a single link.
+        """
+        links = []
+        for start in range(0, len(objs_in_data), self.chunk_size):
+            chunk = objs_in_data[start:start + self.chunk_size]
+            keys = [self.dedup_key(obj_in_data) for obj_in_data in chunk]
+            existing = await self.find_existing(db, set(keys))
+            missing = {}
+            for key, obj_in_data in zip(keys, chunk):
+                if key not in existing:
+                    missing.setdefault(key, obj_in_data)
+            if missing:
+                short_forms = await self.allocator.allocate(db, len(missing))
+                statement = insert(
+                    self._model
+                ).values([
+                    self.create_values(obj_in_data, short_form)
+                    for obj_in_data, short_form in zip(
+                        missing.values(), short_forms
+                    )
+                ]).returning(
+                    *self._model.__table__.columns, self._model.short_url
+                )
+                results = await db.execute(statement=statement)
+                created = {row.short_form: row for row in results}
+                for key, short_form in zip(missing, short_forms):
+                    existing[key] = created[short_form]
+                if self.short_form_filter is not None:
+                    for short_form in short_forms:
+                        self.short_form_filter.add(short_form)
+            await db.commit()
+            links.extend(existing[key] for key in keys)
+        return links
 
     async def add_request(
             self,
             db: AsyncSession,
             *,
-            obj: ModelType,
+            obj: Union[ModelType, CachedShortUrl],
             request: ClientRequest
-    ) -> ModelType:
-        request_obj = self._request_model(
-            url=obj,
-            client_host=request.client.host,
+    ) -> Union[ModelType, CachedShortUrl]:
+        event = ClickEvent(
+            url_id=obj.id,
+            made_at=datetime.utcnow(),
+            client_host=inet_host(request.client.host),
             client_port=request.client.port
         )
-        db.add(request_obj)
+        if self.click_writer is not None and self.click_writer.running:
+            await self.click_writer.put(event)
+            return obj
+        await db.execute(
+            select(func.pg_advisory_xact_lock_shared(FENCE_LOCK_ID))
+        )
+        db.add(self._request_model(**event._asdict()))
+        await db.execute(
+            counter_statement(self._model.__table__),
+            {'link_id': obj.id, 'clicks': 1}
+        )
         await db.commit()
-        await db.refresh(obj)
         return obj
 
+    async def listen_deleted(self, engine: AsyncEngine) -> None:
+        """
+        Drop links deleted by any worker from ``cache``, run by every
+        worker. Deletes missed while reconnecting are covered by clearing
+        the cache.
+        """
+        def on_delete(connection, pid, channel, short_form):
+            self.cache.pop(short_form)
+
+        while True:
+            terminated = asyncio.Event()
+            try:
+                async with engine.connect() as connection:
+                    raw = await connection.get_raw_connection()
+                    driver = raw.driver_connection
+                    driver.add_termination_listener(
+                        lambda connection: terminated.set()
+                    )
+                    await driver.add_listener(DELETE_CHANNEL, on_delete)
+                    self.cache.clear()
+                    try:
+                        await terminated.wait()
+                    finally:
+                        if not driver.is_closed():
+                            await driver.remove_listener(
+                                DELETE_CHANNEL, on_delete
+                            )
+            except Exception:
+                logger.exception('Listening for deleted links failed')
+            await asyncio.sleep(1)
+
     async def delete(
             self,
             db: AsyncSession,
             *,
             url_id: str
-    ) -> ModelType:
-        db_obj = await self.get(db, url_id)
-        db_obj.deleted = True
+    ) -> Optional[Row]:
+        """Return None if there is no live link ``url_id``."""
+        deleted = await self.delete_multi(db, url_ids=[url_id])
+        return deleted[0] if deleted else None
+
+    async def delete_multi(
+            self,
+            db: AsyncSession,
+            *,
+            url_ids: List[str]
+    ) -> List[Row]:
+        """Mark the live links among ``url_ids`` deleted in one statement."""
+        table = self._model.__table__
+        statement = update(
+            table
+        ).where(
+            table.c.short_form.in_(url_ids),
+            table.c.deleted.isnot(True)
+        ).values(
+            deleted=True,
+            deleted_at=datetime.utcnow()
+        ).returning(
+            *table.columns, self._model.short_url
+        )
+        results = await db.execute(statement=statement)
+        deleted = results.all()
+        short_forms = [row.short_form for row in deleted]
+        if (self.cache is not None or self.shared_table is not None) and (
+            short_forms
+        ):
+            # Delivered on commit to every worker, see listen_deleted.
+            await db.execute(
+                NOTIFY_DELETED,
+                {'channel': DELETE_CHANNEL, 'short_forms': short_forms}
+            )
         await db.commit()
-        await db.refresh(db_obj)
-        return db_obj
+        for short_form in short_forms:
+            if self.cache is not None:
+                self.cache.pop(short_form)
+            if self.shared_table is not None:
+                self.shared_table.mark_deleted(short_form)
+        return deleted
@@ -0,0 +1,168 @@
+import hashlib
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Type
+
+from sqlalchemy import Sequence, column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .allocator import decode
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.bits = max(
+            8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for index in range(self.hashes):
+            yield (first + index * second) % self.bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._array[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+    @property
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+class ShortFormFilter:
+    """
+    Negative cache of short forms backed by a Bloom filter of every
+    ``short_form`` in the table. The first rebuild streams the whole
+    table; later ones only add links created since the previous scan
+    started, less ``scan_overlap`` seconds that cover create transactions
+    committing after that scan and clock skew between workers. Codes of
+    deleted links may stay in the filter, which only costs a lookup. The
+    filter is rebuilt in full once it holds ``capacity`` codes.
+
+    Other workers keep creating links after a scan, so a miss is only
+    trusted for codes the allocator cannot have handed out since: legacy
+    or malformed codes, and codes whose sequence number is not above the
+    sequence value read at the previous rebuild. The allocator drops
+    reserved blocks after ``short_form_block_ttl``, which must stay below
+    the rebuild interval, so such codes were inserted before this scan.
+    """
+
+    def __init__(
+            self,
+            capacity: int,
+            error_rate: float,
+            scan_overlap: float = 60.0,
+            timer: Callable[[], float] = time.perf_counter
+    ) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.scan_overlap = scan_overlap
+        self._timer = timer
+        self._scan_started: Optional[datetime] = None
+        self.bloom: Optional[BloomFilter] = None
+        self.trusted_upto = 0
+        self._last_sequence_value = 0
+        self.rejected = 0
+        self.rebuilds = 0
+        self.full_rebuilds = 0
+        self.rebuild_seconds = 0.0
+
+    def is_absent(self, short_form: str) -> bool:
+        if self.bloom is None:
+            return False
+        number = decode(short_form)
+        if number is not None and number > self.trusted_upto:
+            return False
+        if short_form in self.bloom:
+            return False
+        self.rejected += 1
+        return True
+
+    def add(self, short_form: str) -> None:
+        if self.bloom is not None:
+            self.bloom.add(short_form)
+
+    async def rebuild(
+            self,
+            session_factory: Callable[[], Any],
+            model: Type[Any],
+            sequence: Sequence,
+            partition_size: int = 10000
+    ) -> None:
+        started = self._timer()
+        scan_started = datetime.utcnow()
+        statement = select(model.short_form)
+        if self.bloom is None or self.bloom.count >= self.bloom.capacity:
+            capacity = self.capacity
+            if self.bloom is not None:
+                capacity = max(capacity, 2 * self.bloom.count)
+            bloom = BloomFilter(capacity, self.error_rate)
+        else:
+            bloom = self.bloom
+            statement = statement.where(
+                model.created_at >= self._scan_started - timedelta(
+                    seconds=self.scan_overlap
+                )
+            )
+        async with session_factory() as session:
+            sequence_value = await self._sequence_value(session, sequence)
+            results = await session.stream(
+                statement.execution_options(yield_per=partition_size)
+            )
+            async for partition in results.partitions(partition_size):
+                for short_form, in partition:
+                    bloom.add(short_form)
+        if bloom is not self.bloom:
+            self.bloom = bloom
+            self.full_rebuilds += 1
+        self._scan_started = scan_started
+        self.trusted_upto = self._last_sequence_value
+        self._last_sequence_value = sequence_value
+        self.rebuilds += 1
+        self.rebuild_seconds = self._timer() - started
+
+    @staticmethod
+    async def _sequence_value(
+            session: AsyncSession,
+            sequence: Sequence
+    ) -> int:
+        results = await session.execute(
+            select(column('last_value')).select_from(table(sequence.name))
+        )
+        return results.scalar_one()
+
+    def stats(self) -> dict:
+        if self.bloom is None:
+            return {'ready': False}
+        return {
+            'ready': True,
+            'size_bytes': self.bloom.size_bytes,
+            'items': self.bloom.count,
+            'capacity': self.bloom.capacity,
+            'hashes': self.bloom.hashes,
+            'false_positive_rate': self.bloom.false_positive_rate,
+            'trusted_upto': self.trusted_upto,
+            'rejected': self.rejected,
+            'rebuilds': self.rebuilds,
+            'full_rebuilds': self.full_rebuilds,
+            'rebuild_seconds': self.rebuild_seconds,
+        }
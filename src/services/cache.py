@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Hashable, NamedTuple, Optional
+
+
+class CachedShortUrl(NamedTuple):
+    id: int
+    origin_url: str
+    short_url: str
+    short_form: str
+    deleted: bool
+    created_at: Optional[datetime] = None
+    redirect_status: Optional[int] = None
+    cache_max_age: Optional[int] = None
+
+    @classmethod
+    def from_model(cls, db_obj: Any) -> 'CachedShortUrl':
+        return cls(
+            id=db_obj.id,
+            origin_url=str(db_obj.origin_url),
+            short_url=str(db_obj.short_url),
+            short_form=db_obj.short_form,
+            deleted=bool(db_obj.deleted),
+            created_at=db_obj.created_at,
+            redirect_status=db_obj.redirect_status,
+            cache_max_age=db_obj.cache_max_age,
+        )
+
+
+class LRUCache:
+    """
+    Bounded LRU mapping whose entries expire ``ttl`` seconds after insert.
+    A ``maxsize`` of zero disables the cache.
+    """
+
+    def __init__(
+            self,
+            maxsize: int,
+            ttl: float,
+            timer: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: 'OrderedDict[Hashable, tuple[float, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at <= self._timer():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (self._timer() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,206 @@
+import asyncio
+import ipaddress
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Table, bindparam, func, insert, select, update
+from sqlalchemy.exc import DataError, IntegrityError
+
+
+logger = logging.getLogger(__name__)
+
+# Held in share mode by every transaction inserting ``requests`` rows and
+# taken exclusively by RollupAggregator to find an id below which every
+# inserted row is already committed.
+FENCE_LOCK_ID = 7303
+
+
+class ClickEvent(NamedTuple):
+    url_id: int
+    made_at: datetime
+    client_host: Optional[str]
+    client_port: int
+
+
+def inet_host(host: str) -> Optional[str]:
+    """``host`` if it fits the INET column, else None."""
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    return host
+
+
+class ClickWriter:
+    """
+    Write-behind buffer for redirect clicks.
+
+    Events go to a bounded queue (``put`` waits while it is full) and a
+    background task writes them with one multi-row INSERT as soon as
+    ``batch_size`` events are collected or ``flush_interval`` seconds have
+    passed since the first one, bumping the per-link ``requests_number``
+    counters of ``url_table`` in the same transaction. ``stop`` drains
+    everything still queued.
+
+    A failed batch is retried once. If the rows themselves are rejected,
+    e.g. a click of a link purged meanwhile, the batch is split in halves
+    until the failing rows are isolated, so only they are dropped.
+    """
+
+    def __init__(
+            self,
+            session_factory: Callable[[], Any],
+            table: Table,
+            url_table: Table,
+            *,
+            batch_size: int,
+            flush_interval: float,
+            queue_size: int
+    ) -> None:
+        self._session_factory = session_factory
+        self._table = table
+        self._url_table = url_table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._pending: List[ClickEvent] = []
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def put(self, event: ClickEvent) -> None:
+        await self._queue.put(event)
+
+    async def flush(self) -> None:
+        """Write every queued and collected event right now."""
+        if self._lock is None:
+            return
+        async with self._lock:
+            while not self._queue.empty():
+                self._pending.append(self._queue.get_nowait())
+            batch, self._pending = self._pending, []
+            for start in range(0, len(batch), self.batch_size):
+                await self._write(batch[start:start + self.batch_size])
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                self._pending.append(event)
+            await asyncio.shield(self.flush())
+
+    async def _insert(self, batch: List[ClickEvent]) -> None:
+        async with self._session_factory() as session:
+            await session.execute(
+                select(func.pg_advisory_xact_lock_shared(FENCE_LOCK_ID))
+            )
+            await session.execute(
+                insert(self._table).values(
+                    [event._asdict() for event in batch]
+                )
+            )
+            await session.execute(
+                counter_statement(self._url_table),
+                count_clicks(batch)
+            )
+            await session.commit()
+
+    async def _write(self, batch: List[ClickEvent]) -> None:
+        try:
+            await self._insert(batch)
+        except Exception:
+            logger.warning(
+                'Failed to write %s clicks, retrying', len(batch),
+                exc_info=True
+            )
+        else:
+            self.written += len(batch)
+            return
+        try:
+            await self._insert(batch)
+        except (DataError, IntegrityError):
+            await self._write_halves(batch)
+        except Exception:
+            self.dropped += len(batch)
+            logger.exception('Failed to write %s clicks', len(batch))
+        else:
+            self.written += len(batch)
+
+    async def _write_halves(self, batch: List[ClickEvent]) -> None:
+        """Write halves of a rejected ``batch``, dropping rejected clicks."""
+        if len(batch) == 1:
+            self.dropped += 1
+            logger.error('Dropped rejected click %s', batch[0])
+            return
+        middle = len(batch) // 2
+        for half in (batch[:middle], batch[middle:]):
+            try:
+                await self._insert(half)
+            except (DataError, IntegrityError):
+                await self._write_halves(half)
+            except Exception:
+                self.dropped += len(half)
+                logger.exception('Failed to write %s clicks', len(half))
+            else:
+                self.written += len(half)
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'queue_size': self.queue_size,
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+
+def counter_statement(url_table: Table):
+    """UPDATE adding ``clicks`` to ``requests_number`` of link ``link_id``."""
+    return update(url_table).where(
+        url_table.c.id == bindparam('link_id')
+    ).values(
+        requests_number=url_table.c.requests_number + bindparam('clicks')
+    )
+
+
+def count_clicks(batch: List[ClickEvent]) -> List[dict]:
+    """Parameters for ``counter_statement``, ordered by id to keep a stable lock order."""
+    counts = Counter(event.url_id for event in batch)
+    return [
+        {'link_id': url_id, 'clicks': clicks}
+        for url_id, clicks in sorted(counts.items())
+    ]
@@ -0,0 +1,38 @@
+import hashlib
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of ``url`` for deduplication: lowercase scheme and
+    host, no default port and ``/`` for an empty path. The fragment is
+    kept, single-page apps route on it.
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    try:
+        port: Optional[int] = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ''
+    if ':' in host:
+        host = f'[{host}]'
+    userinfo, at, _ = parts.netloc.rpartition('@')
+    netloc = userinfo + at + host
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{port}'
+    path = parts.path or ('/' if netloc else '')
+    return urlunsplit((scheme, netloc, path, parts.query, parts.fragment))
+
+
+def origin_hash(url: str) -> int:
+    """Signed 64-bit hash of the normalized ``url``, fits a BIGINT."""
+    digest = hashlib.blake2b(
+        normalize_url(url).encode(), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, 'big', signed=True)
@@ -0,0 +1,655 @@
+import array
+import asyncio
+import bisect
+import collections
+import fcntl
+import logging
+import mmap
+import os
+import time
+from datetime import datetime, timedelta
+from typing import (Any, AsyncIterator, Callable, Dict, Iterable, List,
+                    NamedTuple, Optional, Tuple)
+
+import orjson
+from fastapi import Request as ClientRequest
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from src.models.urls_app import build_short_url
+from .allocator import encode
+from .base import Repository
+
+
+logger = logging.getLogger(__name__)
+
+# Record kinds, every record is one JSON object on its own line.
+LINK = 'L'
+DELETE = 'D'
+CLICK = 'C'
+# A click index entry packs the record offset and its length.
+LENGTH_BITS = 16
+LENGTH_MASK = (1 << LENGTH_BITS) - 1
+
+
+class ClickRow(NamedTuple):
+    id: int
+    made_at: datetime
+    client_host: str
+    client_port: int
+
+
+class BucketRow(NamedTuple):
+    bucket: datetime
+    requests_number: int
+
+
+class LinkRecord:
+    __slots__ = (
+        'id', 'origin_url', 'short_url', 'short_form', 'created_at',
+        'deleted', 'expired_clicks', 'redirect_status', 'cache_max_age',
+        'click_ids', 'click_entries', 'minute_clicks',
+    )
+
+    def __init__(
+            self,
+            id: int,
+            origin_url: str,
+            short_url: str,
+            short_form: str,
+            created_at: datetime,
+            deleted: bool = False,
+            expired_clicks: int = 0,
+            redirect_status: Optional[int] = None,
+            cache_max_age: Optional[int] = None
+    ) -> None:
+        self.id = id
+        self.origin_url = origin_url
+        self.short_url = short_url
+        self.short_form = short_form
+        self.created_at = created_at
+        self.deleted = deleted
+        # Clicks dropped by compaction still count in requests_number.
+        self.expired_clicks = expired_clicks
+        self.redirect_status = redirect_status
+        self.cache_max_age = cache_max_age
+        self.click_ids = array.array('Q')
+        self.click_entries = array.array('Q')
+        # Clicks per 'YYYY-MM-DDTHH:MM' minute, created on the first click.
+        self.minute_clicks: Optional[Dict[str, int]] = None
+
+    @property
+    def requests_number(self) -> int:
+        return self.expired_clicks + len(self.click_ids)
+
+    def add_click(self, click_id: int, entry: int, made_at: str) -> None:
+        self.click_ids.append(click_id)
+        self.click_entries.append(entry)
+        if self.minute_clicks is None:
+            self.minute_clicks = {}
+        minute = _minute(made_at)
+        self.minute_clicks[minute] = self.minute_clicks.get(minute, 0) + 1
+
+    def to_record(self) -> dict:
+        return {
+            't': LINK,
+            'id': self.id,
+            'o': self.origin_url,
+            's': self.short_url,
+            'f': self.short_form,
+            'c': self.created_at,
+            'd': self.deleted,
+            'e': self.expired_clicks,
+            'r': self.redirect_status,
+            'a': self.cache_max_age,
+        }
+
+
+def _line(record: dict) -> bytes:
+    return orjson.dumps(record) + b'\n'
+
+
+def _minute(made_at: str) -> str:
+    # ISO timestamps share the 'YYYY-MM-DDTHH:MM' prefix of their minute.
+    return made_at[:16]
+
+
+class LogStore:
+    """
+    Append-only file of link, delete and click records with an in-memory
+    index: links by short form and id, and per link the ids and file
+    offsets of its clicks. The index is rebuilt from an mmap of the file
+    on open, and a record torn by a crash at the end of the file is cut
+    off. ``compact`` rewrites the file without delete records and
+    without clicks older than the retention.
+
+    Clicks are kept in append order, which is also (made_at, id) order
+    because both are assigned by the single writer at append time. A lock
+    file keeps a second process from writing the same log. Writes block,
+    so async callers run them in a thread.
+    """
+
+    def __init__(self, path: str, fsync: bool = False) -> None:
+        self.path = path
+        self.fsync = fsync
+        self.links: Dict[str, LinkRecord] = {}
+        self._by_id: Dict[int, LinkRecord] = {}
+        self._lock_file: Optional[Any] = None
+        self._write_fd: Optional[int] = None
+        self._read_fd: Optional[int] = None
+        self._size = 0
+        self._next_link_id = 1
+        self._next_click_id = 1
+        self.clicks = 0
+        self.garbage_records = 0
+        self.compactions = 0
+        self.compaction_seconds = 0.0
+
+    @property
+    def opened(self) -> bool:
+        return self._write_fd is not None
+
+    def open(self) -> None:
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(f'{self.path} is used by another process')
+        self._lock_file = lock_file
+        started = time.perf_counter()
+        self._load()
+        self._open_files()
+        logger.info(
+            'Loaded %s links from %s in %.3fs',
+            len(self.links), self.path, time.perf_counter() - started
+        )
+
+    def close(self) -> None:
+        if self._write_fd is not None:
+            os.close(self._write_fd)
+            os.close(self._read_fd)
+            self._write_fd = self._read_fd = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _open_files(self) -> None:
+        self._write_fd = os.open(
+            self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+        self._read_fd = os.open(self.path, os.O_RDONLY)
+
+    def _load(self) -> None:
+        self.links.clear()
+        self._by_id.clear()
+        self.clicks = 0
+        self.garbage_records = 0
+        self._size = 0
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return
+        with open(self.path, 'r+b') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                position, end = 0, len(data)
+                while position < end:
+                    newline = data.find(b'\n', position)
+                    if newline == -1:
+                        break
+                    try:
+                        record = orjson.loads(data[position:newline])
+                    except orjson.JSONDecodeError:
+                        raise ValueError(
+                            f'Corrupted record at {position} of {self.path}'
+                        )
+                    self._apply(record, position, newline + 1 - position)
+                    position = newline + 1
+            if position < end:
+                logger.warning(
+                    'Cut a torn record of %s bytes off %s',
+                    end - position, self.path
+                )
+                file.truncate(position)
+        self._size = position
+
+    def _apply(self, record: dict, offset: int, length: int) -> None:
+        kind = record['t']
+        if kind == CLICK:
+            link = self._by_id.get(record['u'])
+            if link is None:
+                self.garbage_records += 1
+                return
+            link.add_click(
+                record['id'], offset << LENGTH_BITS | length, record['m']
+            )
+            self.clicks += 1
+            self._next_click_id = max(self._next_click_id, record['id'] + 1)
+        elif kind == LINK:
+            link = LinkRecord(
+                record['id'],
+                record['o'],
+                record['s'],
+                record['f'],
+                datetime.fromisoformat(record['c']),
+                record['d'],
+                record['e'],
+                record.get('r'),
+                record.get('a')
+            )
+            self.links[link.short_form] = link
+            self._by_id[link.id] = link
+            self._next_link_id = max(self._next_link_id, link.id + 1)
+        elif kind == DELETE:
+            # The link record itself may be lost to a hand-edited log.
+            link = self._by_id.get(record['id'])
+            if link is not None:
+                link.deleted = True
+            self.garbage_records += 1
+
+    def _append(self, lines: List[bytes]) -> int:
+        """
+        Write ``lines`` at the end of the log, return their offset. A
+        failed or partial write is cut off again, so the log never ends
+        in a torn record and ``_size`` stays the file size.
+        """
+        offset = self._size
+        data = memoryview(b''.join(lines))
+        written = 0
+        try:
+            while written < len(data):
+                written += os.write(self._write_fd, data[written:])
+            if self.fsync:
+                os.fsync(self._write_fd)
+        except OSError:
+            try:
+                os.ftruncate(self._write_fd, offset)
+            finally:
+                self._size = os.fstat(self._write_fd).st_size
+            raise
+        self._size = offset + len(data)
+        return offset
+
+    def get_by_id(self, link_id: int) -> Optional[LinkRecord]:
+        return self._by_id.get(link_id)
+
+    def create_links(
+            self,
+            objs_in_data: Iterable[dict],
+            short_url: Callable[[str], str]
+    ) -> List[LinkRecord]:
+        """Append links for ``objs_in_data`` of the ShortUrlCreate fields."""
+        created_at = datetime.utcnow()
+        links = []
+        for link_id, obj_in_data in enumerate(objs_in_data, self._next_link_id):
+            short_form = encode(link_id)
+            links.append(LinkRecord(
+                link_id,
+                obj_in_data['origin_url'],
+                short_url(short_form),
+                short_form,
+                created_at,
+                redirect_status=obj_in_data.get('redirect_status'),
+                cache_max_age=obj_in_data.get('cache_max_age')
+            ))
+        self._append([_line(link.to_record()) for link in links])
+        for link in links:
+            self.links[link.short_form] = link
+            self._by_id[link.id] = link
+        self._next_link_id += len(links)
+        return links
+
+    def delete(self, link: LinkRecord) -> None:
+        self.delete_links([link])
+
+    def delete_links(self, links: List[LinkRecord]) -> None:
+        self._append([_line({'t': DELETE, 'id': link.id}) for link in links])
+        for link in links:
+            link.deleted = True
+        self.garbage_records += len(links)
+
+    def add_click(
+            self,
+            link: LinkRecord,
+            made_at: datetime,
+            client_host: str,
+            client_port: int
+    ) -> None:
+        self.add_clicks([(link, made_at, client_host, client_port)])
+
+    def add_clicks(
+            self,
+            clicks: List[Tuple[LinkRecord, datetime, str, int]]
+    ) -> None:
+        """Append (link, made_at, client_host, client_port) clicks at once."""
+        lines = []
+        for click_id, (link, made_at, client_host, client_port) in enumerate(
+            clicks, self._next_click_id
+        ):
+            line = _line({
+                't': CLICK,
+                'id': click_id,
+                'u': link.id,
+                'm': made_at,
+                'h': client_host,
+                'p': client_port,
+            })
+            assert len(line) <= LENGTH_MASK, 'Click record is too long'
+            lines.append(line)
+        offset = self._append(lines)
+        for click_id, (link, made_at, *_), line in zip(
+            range(self._next_click_id, self._next_click_id + len(clicks)),
+            clicks,
+            lines
+        ):
+            link.add_click(
+                click_id, offset << LENGTH_BITS | len(line), made_at.isoformat()
+            )
+            offset += len(line)
+        self.clicks += len(clicks)
+        self._next_click_id += len(clicks)
+
+    def _read(self, entry: int) -> bytes:
+        return os.pread(
+            self._read_fd, entry & LENGTH_MASK, entry >> LENGTH_BITS
+        )
+
+    def read_clicks(
+            self,
+            link: LinkRecord,
+            start: int,
+            stop: Optional[int] = None
+    ) -> List[ClickRow]:
+        rows = []
+        for entry in link.click_entries[start:stop]:
+            record = orjson.loads(self._read(entry))
+            rows.append(ClickRow(
+                record['id'],
+                datetime.fromisoformat(record['m']),
+                record['h'],
+                record['p']
+            ))
+        return rows
+
+    def _kept_clicks(
+            self,
+            link: LinkRecord,
+            cutoff: Optional[datetime]
+    ) -> Tuple[List[Tuple[int, bytes]], int, Optional[Dict[str, int]]]:
+        """
+        The (id, line) of the clicks of ``link`` made at ``cutoff`` or
+        later, its expired click count and minute counters after dropping
+        the others.
+        """
+        if cutoff is None:
+            return [
+                (click_id, self._read(entry))
+                for click_id, entry in zip(link.click_ids, link.click_entries)
+            ], link.expired_clicks, link.minute_clicks
+        clicks = []
+        expired = link.expired_clicks
+        minute_clicks = {}
+        for click_id, entry in zip(link.click_ids, link.click_entries):
+            line = self._read(entry)
+            made_at = orjson.loads(line)['m']
+            if datetime.fromisoformat(made_at) < cutoff:
+                expired += 1
+                continue
+            minute = _minute(made_at)
+            minute_clicks[minute] = minute_clicks.get(minute, 0) + 1
+            clicks.append((click_id, line))
+        return clicks, expired, minute_clicks or None
+
+    def compact(self, click_retention: Optional[float] = None) -> bool:
+        """
+        Rewrite the log if it holds garbage or expired clicks. The caller
+        must keep other writes and click reads out while this runs.
+        """
+        cutoff = None
+        if click_retention is not None:
+            cutoff = datetime.utcnow() - timedelta(seconds=click_retention)
+        if not self.garbage_records and cutoff is None:
+            return False
+        started = time.perf_counter()
+        temporary = self.path + '.compact'
+        indexes = {}
+        size = clicks_kept = 0
+        with open(temporary, 'wb') as file:
+            for link in self._by_id.values():
+                clicks, expired, minute_clicks = self._kept_clicks(link, cutoff)
+                record = link.to_record()
+                record['e'] = expired
+                line = _line(record)
+                file.write(line)
+                size += len(line)
+                click_ids, click_entries = array.array('Q'), array.array('Q')
+                for click_id, line in clicks:
+                    file.write(line)
+                    click_ids.append(click_id)
+                    click_entries.append(size << LENGTH_BITS | len(line))
+                    size += len(line)
+                indexes[link.id] = (
+                    expired, click_ids, click_entries, minute_clicks
+                )
+                clicks_kept += len(click_ids)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        os.close(self._write_fd)
+        os.close(self._read_fd)
+        self._open_files()
+        for link_id, index in indexes.items():
+            link = self._by_id[link_id]
+            (
+                link.expired_clicks,
+                link.click_ids,
+                link.click_entries,
+                link.minute_clicks
+            ) = index
+        self._size = size
+        self.clicks = clicks_kept
+        self.garbage_records = 0
+        self.compactions += 1
+        self.compaction_seconds = time.perf_counter() - started
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'links': len(self.links),
+            'clicks': self.clicks,
+            'file_bytes': self._size,
+            'garbage_records': self.garbage_records,
+            'compactions': self.compactions,
+            'compaction_seconds': self.compaction_seconds,
+        }
+
+
+def truncate(value: datetime, granularity: str) -> datetime:
+    value = value.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        value = value.replace(minute=0)
+    return value
+
+
+class RepositoryShortUrlLog(Repository):
+    """
+    Repository over a LogStore for single-process nodes without
+    PostgreSQL. The ``db`` arguments are only there to share the
+    interface with RepositoryShotUrlDB and are ignored. The store is
+    opened by the first call in the serving process. Writes run in a
+    thread under ``_lock``, and clicks that arrive meanwhile are appended
+    together by the next holder.
+    """
+
+    cache = None
+    click_writer = None
+    short_form_filter = None
+    shared_table = None
+
+    def __init__(
+            self,
+            store: LogStore,
+            click_retention: Optional[float] = None
+    ) -> None:
+        self.store = store
+        self.click_retention = click_retention
+        self._lock = asyncio.Lock()
+        self._clicks: List[Tuple[LinkRecord, datetime, str, int]] = []
+
+    def _store(self) -> LogStore:
+        if not self.store.opened:
+            self.store.open()
+        return self.store
+
+    async def get_link(self, db: Any, url_id: Any) -> Optional[LinkRecord]:
+        return self._store().links.get(url_id)
+
+    get_cached = get_link
+
+    async def get_status(
+            self,
+            db: Any,
+            url_id: Any,
+            limit: int,
+            offset: int,
+            full_info: Optional[bool],
+            after: Optional[tuple[datetime, int]] = None,
+    ) -> Any:
+        link = self._store().get_by_id(url_id)
+        if not full_info:
+            return link.requests_number
+        async with self._lock:
+            if after is not None:
+                offset = bisect.bisect_right(link.click_ids, after[1])
+            return self.store.read_clicks(link, offset, offset + limit)
+
+    async def get_rollups(
+            self,
+            db: Any,
+            url_id: Any,
+            granularity: str,
+            start: datetime,
+            end: datetime,
+    ) -> List[BucketRow]:
+        link = self._store().get_by_id(url_id)
+        async with self._lock:
+            minute_clicks = dict(link.minute_clicks or {})
+        buckets = collections.Counter()
+        for minute, requests_number in minute_clicks.items():
+            bucket = truncate(datetime.fromisoformat(minute), granularity)
+            if start <= bucket < end:
+                buckets[bucket] += requests_number
+        return [
+            BucketRow(bucket, requests_number)
+            for bucket, requests_number in sorted(buckets.items())
+        ]
+
+    async def stream_requests(
+            self,
+            db: Any,
+            url_id: Any,
+            partition_size: int,
+            after: Optional[tuple[datetime, int]] = None,
+    ) -> AsyncIterator[List[ClickRow]]:
+        link = self._store().get_by_id(url_id)
+        last_id = after[1] if after is not None else 0
+        while True:
+            # Positions move when compaction drops clicks, ids do not.
+            async with self._lock:
+                start = bisect.bisect_right(link.click_ids, last_id)
+                partition = self.store.read_clicks(
+                    link, start, start + partition_size
+                )
+            if not partition:
+                return
+            yield partition
+            last_id = partition[-1].id
+
+    async def create(self, db: Any, *, obj_in: BaseModel) -> LinkRecord:
+        obj_in_data = jsonable_encoder(obj_in)
+        store = self._store()
+        async with self._lock:
+            link, = await asyncio.to_thread(
+                store.create_links, [obj_in_data], build_short_url
+            )
+        return link
+
+    async def create_multi(
+            self,
+            db: Any,
+            *,
+            obj_in: BaseModel
+    ) -> List[LinkRecord]:
+        objs_in_data = jsonable_encoder(obj_in)
+        store = self._store()
+        async with self._lock:
+            return await asyncio.to_thread(
+                store.create_links, objs_in_data, build_short_url
+            )
+
+    async def add_request(
+            self,
+            db: Any,
+            *,
+            obj: LinkRecord,
+            request: ClientRequest
+    ) -> LinkRecord:
+        self._store()
+        self._clicks.append((
+            obj, datetime.utcnow(), request.client.host, request.client.port
+        ))
+        async with self._lock:
+            await self._write_clicks()
+        return obj
+
+    async def _write_clicks(self) -> None:
+        """Append every click queued so far with one write."""
+        if not self._clicks:
+            return
+        clicks, self._clicks = self._clicks, []
+        try:
+            await asyncio.to_thread(self.store.add_clicks, clicks)
+        except OSError:
+            # The failed write was cut off, the next holder retries.
+            self._clicks[:0] = clicks
+            raise
+
+    async def delete(
+            self,
+            db: Any,
+            *,
+            url_id: str
+    ) -> Optional[LinkRecord]:
+        deleted = await self.delete_multi(db, url_ids=[url_id])
+        return deleted[0] if deleted else None
+
+    async def delete_multi(
+            self,
+            db: Any,
+            *,
+            url_ids: List[str]
+    ) -> List[LinkRecord]:
+        store = self._store()
+        deleted = []
+        async with self._lock:
+            for url_id in url_ids:
+                link = store.links.get(url_id)
+                if link is not None and not link.deleted:
+                    deleted.append(link)
+            if deleted:
+                await asyncio.to_thread(store.delete_links, deleted)
+        return deleted
+
+    async def compact(self) -> None:
+        store = self._store()
+        async with self._lock:
+            compacted = await asyncio.to_thread(
+                store.compact, self.click_retention
+            )
+        if compacted:
+            logger.info(
+                'Compacted %s in %.3fs', store.path, store.compaction_seconds
+            )
@@ -0,0 +1,109 @@
+import logging
+import re
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+
+logger = logging.getLogger(__name__)
+
+# Serialises maintenance of concurrent workers.
+ADVISORY_LOCK_ID = 7301
+PARTITIONS_QUERY = text(
+    'SELECT child.relname, pg_inherits.inhdetachpending FROM pg_inherits '
+    'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+    'WHERE pg_inherits.inhparent = CAST(:parent AS regclass)'
+)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class PartitionManager:
+    """
+    Keeps monthly range partitions of ``table`` by ``made_at``, named
+    ``<table>_yYYYYmMM``: creates the current month and ``ahead`` months
+    after it, and drops partitions that ended more than
+    ``retention_months`` before the current month. Dropping a partition
+    is a catalog change instead of a DELETE, so retention leaves no bloat.
+
+    Old partitions are first detached with ``DETACH PARTITION ...
+    CONCURRENTLY``, which does not block queries on ``table`` the way
+    ``DROP TABLE`` of an attached partition would. It cannot run in a
+    transaction block, so ``run`` works on an autocommit connection and
+    holds a session-level advisory lock. A detach interrupted on a
+    previous run is finished with ``FINALIZE``.
+    """
+
+    def __init__(
+            self,
+            engine: AsyncEngine,
+            table: str,
+            *,
+            ahead: int,
+            retention_months: Optional[int] = None
+    ) -> None:
+        self._engine = engine
+        self.table = table
+        self.ahead = ahead
+        self.retention_months = retention_months
+        self._name = re.compile(rf'^{re.escape(table)}_y(\d{{4}})m(\d{{2}})$')
+
+    def partition_name(self, month: date) -> str:
+        return f'{self.table}_y{month:%Y}m{month:%m}'
+
+    async def run(self) -> None:
+        current = datetime.utcnow().date().replace(day=1)
+        async with self._engine.connect() as connection:
+            connection = await connection.execution_options(
+                isolation_level='AUTOCOMMIT'
+            )
+            await connection.execute(
+                select(func.pg_advisory_lock(ADVISORY_LOCK_ID))
+            )
+            try:
+                await self._maintain(connection, current)
+            finally:
+                await connection.execute(
+                    select(func.pg_advisory_unlock(ADVISORY_LOCK_ID))
+                )
+
+    async def _maintain(
+            self,
+            connection: AsyncConnection,
+            current: date
+    ) -> None:
+        results = await connection.execute(
+            PARTITIONS_QUERY, {'parent': self.table}
+        )
+        existing = dict(results.all())
+        for offset in range(self.ahead + 1):
+            month = add_months(current, offset)
+            name = self.partition_name(month)
+            if name in existing:
+                continue
+            await connection.execute(text(
+                f'CREATE TABLE {name} PARTITION OF {self.table} '
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            ))
+            logger.info('Partition %s created', name)
+        if self.retention_months is None:
+            return
+        cutoff = add_months(current, -self.retention_months)
+        for name, detach_pending in sorted(existing.items()):
+            match = self._name.match(name)
+            if match is None:
+                continue
+            month = date(int(match[1]), int(match[2]), 1)
+            if add_months(month, 1) > cutoff:
+                continue
+            mode = 'FINALIZE' if detach_pending else 'CONCURRENTLY'
+            await connection.execute(text(
+                f'ALTER TABLE {self.table} DETACH PARTITION {name} {mode}'
+            ))
+            await connection.execute(text(f'DROP TABLE {name}'))
+            logger.info('Partition %s dropped', name)
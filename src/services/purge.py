@@ -0,0 +1,105 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Type
+
+from sqlalchemy import delete, func, select, tuple_
+
+
+logger = logging.getLogger(__name__)
+
+# Keeps the workers from purging the same links at once.
+ADVISORY_LOCK_ID = 7302
+
+
+class DeletedLinkPurger:
+    """
+    Hard-deletes links soft-deleted more than ``grace_period`` seconds
+    ago together with their clicks and rollups. Every transaction takes
+    at most ``batch_size`` links and removes at most
+    ``click_batch_size`` clicks, the links themselves go once they have
+    no clicks left, so locks stay short and replicas get the WAL in
+    small steps.
+    """
+
+    def __init__(
+            self,
+            session_factory: Callable[[], Any],
+            model: Type[Any],
+            request_model: Type[Any],
+            rollup_model: Type[Any],
+            *,
+            grace_period: float,
+            batch_size: int,
+            click_batch_size: int
+    ) -> None:
+        self._session_factory = session_factory
+        self._model = model
+        self._request_model = request_model
+        self._rollup_model = rollup_model
+        self.grace_period = grace_period
+        self.batch_size = batch_size
+        self.click_batch_size = click_batch_size
+        self.purged_links = 0
+        self.purged_clicks = 0
+
+    async def _step(self, session: Any, cutoff: datetime) -> bool:
+        """One bounded transaction, False when there is nothing to do."""
+        locked = await session.scalar(
+            select(func.pg_try_advisory_xact_lock(ADVISORY_LOCK_ID))
+        )
+        if not locked:
+            return False
+        results = await session.execute(
+            select(
+                self._model.id
+            ).where(
+                self._model.deleted.is_(True),
+                self._model.deleted_at < cutoff
+            ).order_by(
+                self._model.deleted_at
+            ).limit(
+                self.batch_size
+            )
+        )
+        link_ids = results.scalars().all()
+        if not link_ids:
+            return False
+        requests = self._request_model.__table__
+        clicks = select(
+            requests.c.id, requests.c.made_at
+        ).where(
+            requests.c.url_id.in_(link_ids)
+        ).limit(
+            self.click_batch_size
+        )
+        results = await session.execute(
+            delete(requests).where(
+                tuple_(requests.c.id, requests.c.made_at).in_(clicks)
+            )
+        )
+        self.purged_clicks += results.rowcount
+        if results.rowcount < self.click_batch_size:
+            await session.execute(
+                delete(self._rollup_model.__table__).where(
+                    self._rollup_model.url_id.in_(link_ids)
+                )
+            )
+            await session.execute(
+                delete(self._model.__table__).where(
+                    self._model.id.in_(link_ids)
+                )
+            )
+            self.purged_links += len(link_ids)
+        await session.commit()
+        return True
+
+    async def run(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.grace_period)
+        purged_links = self.purged_links
+        async with self._session_factory() as session:
+            while await self._step(session, cutoff):
+                pass
+        if self.purged_links > purged_links:
+            logger.info(
+                'Purged %s deleted links', self.purged_links - purged_links
+            )
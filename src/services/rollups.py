@@ -0,0 +1,119 @@
+import logging
+from typing import Any, Callable, Type
+
+from sqlalchemy import func, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+
+from .clicks import FENCE_LOCK_ID
+
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('minute', 'hour')
+STATE_ID = 1
+
+
+class RollupAggregator:
+    """
+    Folds new ``requests`` rows into per-minute and per-hour buckets.
+
+    Progress is a ``last_request_id`` watermark that is moved in the same
+    transaction as the bucket upserts, and the state row is locked with
+    ``FOR UPDATE``, so concurrent or restarted aggregators never count a
+    row twice. Click batches draw ids before they commit and may commit
+    out of order, so the batch end is capped at the highest id seen while
+    holding ``FENCE_LOCK_ID`` exclusively: no insert is in flight then, and
+    every row at or below that id is committed.
+    """
+
+    def __init__(
+            self,
+            session_factory: Callable[[], Any],
+            request_model: Type[Any],
+            rollup_model: Type[Any],
+            state_model: Type[Any],
+            *,
+            batch_size: int
+    ) -> None:
+        self._session_factory = session_factory
+        self._request_model = request_model
+        self._rollup_model = rollup_model
+        self._state_model = state_model
+        self.batch_size = batch_size
+
+    async def run_once(self) -> int:
+        """Fold one batch. Return the number of requests rows consumed."""
+        request = self._request_model
+        rollup = self._rollup_model
+        async with self._session_factory() as session:
+            await session.execute(
+                select(func.pg_advisory_xact_lock(FENCE_LOCK_ID))
+            )
+            fence_id = await session.scalar(select(func.max(request.id)))
+            await session.commit()
+        if fence_id is None:
+            return 0
+        async with self._session_factory() as session:
+            state = await session.get(
+                self._state_model, STATE_ID, with_for_update=True
+            )
+            if state is None:
+                state = self._state_model(id=STATE_ID, last_request_id=0)
+                session.add(state)
+            last_id = state.last_request_id
+            batch = select(
+                request.id
+            ).where(
+                request.id > last_id,
+                request.id <= fence_id
+            ).order_by(
+                request.id
+            ).limit(
+                self.batch_size
+            ).subquery()
+            results = await session.execute(
+                select(func.count(), func.max(batch.c.id))
+            )
+            consumed, upto_id = results.one()
+            if upto_id is None:
+                await session.commit()
+                return 0
+            for granularity in GRANULARITIES:
+                # Inlined so the SELECT and GROUP BY expressions match.
+                bucket = func.date_trunc(
+                    literal_column(f"'{granularity}'"), request.made_at
+                )
+                counts = select(
+                    request.url_id,
+                    literal(granularity),
+                    bucket,
+                    func.count()
+                ).where(
+                    request.id > last_id,
+                    request.id <= upto_id,
+                    request.url_id.isnot(None)
+                ).group_by(
+                    request.url_id, bucket
+                )
+                statement = insert(rollup).from_select(
+                    ['url_id', 'granularity', 'bucket', 'requests_number'],
+                    counts
+                )
+                statement = statement.on_conflict_do_update(
+                    index_elements=['url_id', 'granularity', 'bucket'],
+                    set_={
+                        'requests_number': (
+                            rollup.requests_number
+                            + statement.excluded.requests_number
+                        )
+                    }
+                )
+                await session.execute(statement)
+            state.last_request_id = upto_id
+            await session.commit()
+        return consumed
+
+    async def run(self) -> None:
+        """Fold batches until the backlog is smaller than one batch."""
+        while await self.run_once() >= self.batch_size:
+            logger.info('Rollup batch of %s folded', self.batch_size)
@@ -0,0 +1,375 @@
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import (Any, Callable, Iterable, NamedTuple, Optional, Set,
+                    Tuple, Type)
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHANNEL = 'short_url_deleted'
+
+MAGIC = b'SURLTBL2'
+# magic, slots, heap size; then the active buffer and a sequence number
+# per buffer, odd while the writer is filling it.
+HEADER = struct.Struct('<8sQQ')
+ACTIVE = 24
+SEQUENCES = 32
+HEADER_SIZE = 64
+# short_form, link id, flags, origin URL length and offset in the heap,
+# created_at in epoch seconds, cache max-age (-1 for the default) and
+# redirect status (0 for the default).
+SLOT = struct.Struct('<8sQBxHIqiH2x')
+FLAGS = 16
+OCCUPIED = 1
+DELETED = 2
+WORD = struct.Struct('<Q')
+KEY_SIZE = 8
+
+Entry = Tuple[
+    int, str, str, bool, Optional[datetime], Optional[int], Optional[int]
+]
+
+
+class SharedEntry(NamedTuple):
+    id: int
+    origin_url: str
+    deleted: bool
+    created_at: Optional[datetime]
+    redirect_status: Optional[int]
+    cache_max_age: Optional[int]
+
+
+def _key(short_form: str) -> Optional[bytes]:
+    key = short_form.encode()
+    if len(key) > KEY_SIZE:
+        return None
+    return key.ljust(KEY_SIZE, b'\0')
+
+
+def build_buffer(
+        entries: Iterable[Entry],
+        slots: int,
+        heap_size: int
+) -> Tuple[bytes, int]:
+    """
+    Lay out ``(id, short_form, origin_url, deleted, created_at,
+    redirect_status, cache_max_age)`` entries as a linear probing table
+    followed by the URL heap. Stops at half the slots so
+    probe chains stay short. Return the buffer and the number of entries.
+    """
+    buffer = bytearray(slots * SLOT.size + heap_size)
+    heap = slots * SLOT.size
+    mask = slots - 1
+    used = count = 0
+    for (
+        link_id, short_form, origin_url, deleted,
+        created_at, redirect_status, cache_max_age
+    ) in entries:
+        if count >= slots // 2:
+            break
+        key = _key(short_form)
+        url = origin_url.encode()
+        if key is None or len(url) > 0xFFFF or used + len(url) > heap_size:
+            continue
+        index = zlib.crc32(key) & mask
+        while buffer[index * SLOT.size + FLAGS]:
+            index = (index + 1) & mask
+        SLOT.pack_into(
+            buffer, index * SLOT.size, key, link_id,
+            OCCUPIED | (DELETED if deleted else 0), len(url), used,
+            0 if created_at is None else int(
+                created_at.replace(tzinfo=timezone.utc).timestamp()
+            ),
+            -1 if cache_max_age is None else cache_max_age,
+            redirect_status or 0
+        )
+        buffer[heap + used:heap + used + len(url)] = url
+        used += len(url)
+        count += 1
+    return bytes(buffer), count
+
+
+class SharedRedirectTable:
+    """
+    Hash table of hot short forms in a file mapped by every worker, so
+    the hot set is held once per host and a new worker serves it at once.
+
+    The file holds two buffers. One worker, elected with ``flock``,
+    rebuilds the inactive buffer from the request rollups and then makes
+    it active. Readers check the buffer's sequence number around a lookup
+    (a seqlock) and treat a concurrent rewrite as a miss. Deletes set the
+    flag in place in both buffers and are sent with NOTIFY, so the writer
+    also applies deletes that raced with a rebuild.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            slots: int,
+            heap_size: int,
+            hot_window: float,
+            timer: Callable[[], float] = time.perf_counter
+    ) -> None:
+        assert slots & (slots - 1) == 0, 'Slots must be a power of two'
+        self.path = path
+        self.slots = slots
+        self.heap_size = heap_size
+        self.hot_window = hot_window
+        self._timer = timer
+        self._buffer_size = slots * SLOT.size + heap_size
+        self._mmap: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+        self._lock_file: Optional[Any] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._deleted_during_rebuild: Optional[Set[str]] = None
+        self.entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+
+    @property
+    def writer(self) -> bool:
+        return self._lock_file is not None
+
+    def _attach(self) -> None:
+        """Map the table file, again if the writer has replaced it."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino == self._inode:
+            return
+        if stat.st_size != HEADER_SIZE + 2 * self._buffer_size:
+            return
+        with open(self.path, 'r+b') as file:
+            table = mmap.mmap(file.fileno(), 0)
+        magic, slots, heap_size = HEADER.unpack_from(table)
+        if (magic, slots, heap_size) != (MAGIC, self.slots, self.heap_size):
+            table.close()
+            return
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = table
+        self._inode = stat.st_ino
+
+    def _create(self) -> None:
+        self._attach()
+        if self._mmap is not None:
+            return
+        temporary = f'{self.path}.{os.getpid()}'
+        with open(temporary, 'wb') as file:
+            file.truncate(HEADER_SIZE + 2 * self._buffer_size)
+            file.write(HEADER.pack(MAGIC, self.slots, self.heap_size))
+        os.replace(temporary, self.path)
+        self._attach()
+
+    def _try_lock(self) -> bool:
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info('Worker %s writes the shared redirect table', os.getpid())
+        return True
+
+    def lookup(self, short_form: str) -> Optional[SharedEntry]:
+        table = self._mmap
+        key = _key(short_form)
+        if table is None or key is None:
+            return None
+        active, = WORD.unpack_from(table, ACTIVE)
+        sequence_at = SEQUENCES + active * WORD.size
+        sequence, = WORD.unpack_from(table, sequence_at)
+        if sequence & 1:
+            return None
+        result = self._find(table, active, key)
+        if WORD.unpack_from(table, sequence_at)[0] != sequence:
+            return None
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def _find(
+            self,
+            table: mmap.mmap,
+            buffer: int,
+            key: bytes
+    ) -> Optional[SharedEntry]:
+        base = HEADER_SIZE + buffer * self._buffer_size
+        mask = self.slots - 1
+        index = zlib.crc32(key) & mask
+        for _ in range(self.slots):
+            (
+                slot_key, link_id, flags, length, offset,
+                created_at, cache_max_age, redirect_status
+            ) = SLOT.unpack_from(table, base + index * SLOT.size)
+            if not flags:
+                return None
+            if slot_key == key:
+                start = base + self.slots * SLOT.size + offset
+                try:
+                    origin_url = table[start:start + length].decode()
+                except UnicodeDecodeError:
+                    return None
+                return SharedEntry(
+                    link_id,
+                    origin_url,
+                    bool(flags & DELETED),
+                    datetime.utcfromtimestamp(created_at) if created_at else None,
+                    redirect_status or None,
+                    None if cache_max_age < 0 else cache_max_age
+                )
+            index = (index + 1) & mask
+        return None
+
+    def mark_deleted(self, short_form: str) -> None:
+        table = self._mmap
+        key = _key(short_form)
+        if table is None or key is None:
+            return
+        if self._deleted_during_rebuild is not None:
+            self._deleted_during_rebuild.add(short_form)
+        mask = self.slots - 1
+        for buffer in (0, 1):
+            base = HEADER_SIZE + buffer * self._buffer_size
+            index = zlib.crc32(key) & mask
+            for _ in range(self.slots):
+                position = base + index * SLOT.size
+                flags = table[position + FLAGS]
+                if not flags:
+                    break
+                if table[position:position + KEY_SIZE] == key:
+                    table[position + FLAGS] = flags | DELETED
+                    break
+                index = (index + 1) & mask
+
+    def publish(self, buffer_data: bytes) -> None:
+        table = self._mmap
+        target = 1 - WORD.unpack_from(table, ACTIVE)[0]
+        sequence_at = SEQUENCES + target * WORD.size
+        sequence, = WORD.unpack_from(table, sequence_at)
+        WORD.pack_into(table, sequence_at, sequence + 1)
+        base = HEADER_SIZE + target * self._buffer_size
+        table[base:base + len(buffer_data)] = buffer_data
+        WORD.pack_into(table, sequence_at, sequence + 2)
+        WORD.pack_into(table, ACTIVE, target)
+
+    async def rebuild(
+            self,
+            session_factory: Callable[[], Any],
+            model: Type[Any],
+            rollup_model: Type[Any]
+    ) -> None:
+        """Load the links with most clicks in ``hot_window`` seconds."""
+        started = self._timer()
+        self._deleted_during_rebuild = set()
+        try:
+            hot = select(
+                rollup_model.url_id,
+                func.sum(rollup_model.requests_number).label('clicks')
+            ).where(
+                rollup_model.granularity == 'hour',
+                rollup_model.bucket >= (
+                    datetime.utcnow() - timedelta(seconds=self.hot_window)
+                )
+            ).group_by(
+                rollup_model.url_id
+            ).order_by(
+                desc('clicks')
+            ).limit(
+                self.slots // 2
+            ).subquery()
+            statement = select(
+                model.id, model.short_form, model.origin_url, model.deleted,
+                model.created_at, model.redirect_status, model.cache_max_age
+            ).join(
+                hot, hot.c.url_id == model.id
+            ).order_by(
+                hot.c.clicks.desc()
+            )
+            async with session_factory() as session:
+                results = await session.execute(statement)
+                entries = [
+                    (row.id, row.short_form, str(row.origin_url), *row[3:])
+                    for row in results
+                ]
+            buffer_data, self.entries = await asyncio.to_thread(
+                build_buffer, entries, self.slots, self.heap_size
+            )
+            self.publish(buffer_data)
+            for short_form in self._deleted_during_rebuild:
+                self.mark_deleted(short_form)
+        finally:
+            self._deleted_during_rebuild = None
+        self.rebuilds += 1
+        self.rebuild_seconds = self._timer() - started
+
+    async def _listen(self, engine: AsyncEngine) -> None:
+        def on_delete(connection, pid, channel, short_form):
+            self.mark_deleted(short_form)
+
+        async with engine.connect() as connection:
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.add_listener(DELETE_CHANNEL, on_delete)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await raw.driver_connection.remove_listener(
+                    DELETE_CHANNEL, on_delete
+                )
+
+    async def maintain(
+            self,
+            session_factory: Callable[[], Any],
+            model: Type[Any],
+            rollup_model: Type[Any],
+            engine: AsyncEngine
+    ) -> None:
+        """Periodic job of every worker: attach, or rebuild if elected."""
+        if not self.writer and not self._try_lock():
+            self._attach()
+            return
+        self._create()
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen(engine))
+        await self.rebuild(session_factory, model, rollup_model)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._inode = None
+
+    def stats(self) -> dict:
+        return {
+            'attached': self._mmap is not None,
+            'writer': self.writer,
+            'entries': self.entries,
+            'size_bytes': HEADER_SIZE + 2 * self._buffer_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'rebuilds': self.rebuilds,
+            'rebuild_seconds': self.rebuild_seconds,
+        }
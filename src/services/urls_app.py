@@ -1,8 +1,22 @@
+from src.core.config import app_settings
+from src.db.db import async_session, engine
 from src.models.urls_app import Request as RequestModel
+from src.models.urls_app import RequestRollup as RequestRollupModel
+from src.models.urls_app import RollupState as RollupStateModel
 from src.models.urls_app import ShortUrl as ShortUrlModel
+from src.models.urls_app import short_form_seq
 from src.schemas.short_url import MultiShortUrlCreate, ShortUrlCreate
 
+from .allocator import ShortFormAllocator
 from .base import RepositoryShotUrlDB
+from .bloom import ShortFormFilter
+from .cache import LRUCache
+from .clicks import ClickWriter
+from .log_store import LogStore, RepositoryShortUrlLog
+from .partitions import PartitionManager
+from .purge import DeletedLinkPurger
+from .rollups import RollupAggregator
+from .shared_table import SharedRedirectTable
 
 
 class RepositoryShortUrl(
@@ -16,4 +30,85 @@ class RepositoryShortUrl(
     pass
 
 
-short_url_crud = RepositoryShortUrl(ShortUrlModel, RequestModel)
+if app_settings.storage_backend == 'log':
+    short_url_crud = RepositoryShortUrlLog(
+        LogStore(app_settings.store_path, fsync=app_settings.store_fsync),
+        click_retention=app_settings.store_click_retention
+    )
+else:
+    short_url_crud = RepositoryShortUrl(
+        ShortUrlModel,
+        RequestModel,
+        rollup=RequestRollupModel,
+        allocator=ShortFormAllocator(
+            short_form_seq,
+            block_size=app_settings.short_form_block_size,
+            block_ttl=app_settings.short_form_block_ttl
+        ),
+        chunk_size=app_settings.shorten_chunk_size,
+        cache=LRUCache(
+            maxsize=app_settings.redirect_cache_size,
+            ttl=app_settings.redirect_cache_ttl
+        ),
+        click_writer=ClickWriter(
+            async_session,
+            RequestModel.__table__,
+            ShortUrlModel.__table__,
+            batch_size=app_settings.click_batch_size,
+            flush_interval=app_settings.click_flush_interval,
+            queue_size=app_settings.click_queue_size
+        ),
+        short_form_filter=ShortFormFilter(
+            capacity=app_settings.bloom_capacity,
+            error_rate=app_settings.bloom_error_rate,
+            scan_overlap=app_settings.bloom_scan_overlap
+        ) if app_settings.bloom_enabled else None,
+        shared_table=SharedRedirectTable(
+            app_settings.shared_table_path,
+            slots=app_settings.shared_table_slots,
+            heap_size=app_settings.shared_table_heap_size,
+            hot_window=app_settings.shared_table_hot_window
+        ) if app_settings.shared_table_enabled else None,
+        dedup=app_settings.dedup_origin_urls
+    )
+
+partition_manager = PartitionManager(
+    engine,
+    RequestModel.__tablename__,
+    ahead=app_settings.requests_partitions_ahead,
+    retention_months=app_settings.requests_retention_months
+)
+
+link_purger = DeletedLinkPurger(
+    async_session,
+    ShortUrlModel,
+    RequestModel,
+    RequestRollupModel,
+    grace_period=app_settings.purge_grace_period,
+    batch_size=app_settings.purge_batch_size,
+    click_batch_size=app_settings.purge_click_batch_size
+)
+
+rollup_aggregator = RollupAggregator(
+    async_session,
+    RequestModel,
+    RequestRollupModel,
+    RollupStateModel,
+    batch_size=app_settings.rollup_batch_size
+)
+
+
+async def rebuild_short_form_filter() -> None:
+    await short_url_crud.short_form_filter.rebuild(
+        async_session, ShortUrlModel, short_form_seq
+    )
+
+
+async def listen_deleted_links() -> None:
+    await short_url_crud.listen_deleted(engine)
+
+
+async def maintain_shared_table() -> None:
+    await short_url_crud.shared_table.maintain(
+        async_session, ShortUrlModel, RequestRollupModel, engine
+    )
@@ -1,8 +1,31 @@
+import json
+import time
 from http import HTTPStatus
 
+import pytest
 import requests
 
+from src.core.config import app_settings
 
+LOG_BACKEND = app_settings.storage_backend == 'log'
+# TestClient runs the app in this process, while the live server process
+# holds the lock of the log store.
+in_process = pytest.mark.skipif(
+    LOG_BACKEND, reason='the log store is opened by the live server'
+)
+
+
+def wait_for_clicks(url, number):
+    """Status of ``url`` once its ``number`` queued clicks are written."""
+    for _ in range(30):
+        status = requests.get(url + '/status').json()
+        if status.get('requests_number') == number:
+            break
+        time.sleep(0.1)
+    return status
+
+
+@in_process
 def test_create_short_url(client):
     response = client.post(
         '/api/v1/short_url/',
@@ -14,6 +37,7 @@ def test_create_short_url(client):
     assert 'short_url' in response.json()
 
 
+@in_process
 def test_create_multi_short_url(client):
     response = client.post(
         '/api/v1/short_url/shorten',
@@ -71,6 +95,33 @@ def test_delete(start_server):
     assert get_response.status_code == HTTPStatus.GONE
 
 
+def test_bulk_delete(start_server):
+    created = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/shorten',
+        json=[
+            {'origin_url': 'http://ya.ru/bulk1'},
+            {'origin_url': 'http://ya.ru/bulk2'},
+        ]
+    ).json()
+    url_ids = [link['short_form'] for link in created]
+    response = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/bulk_delete',
+        json=url_ids + ['missing']
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert sorted(link['short_form'] for link in response.json()) == sorted(
+        url_ids
+    )
+    for link in created:
+        get_response = requests.get(link['short_url'], allow_redirects=False)
+        assert get_response.status_code == HTTPStatus.GONE
+        assert requests.delete(link['short_url']).status_code == HTTPStatus.GONE
+    response = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/bulk_delete', json=url_ids
+    )
+    assert response.json() == []
+
+
 def test_status(start_server):
     post_response = requests.post(
         'http://127.0.0.1:8080/api/v1/short_url/',
@@ -92,3 +143,181 @@ def test_status(start_server):
         assert result.get('made_at')
         assert result.get('client_host')
         assert result.get('client_port')
+
+
+def test_cached_redirect_invalidated_on_delete(start_server):
+    post_response = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/',
+        json={
+            'origin_url': 'http://ya.ru'
+        }
+    )
+    url = post_response.json().get('short_url')
+    for _ in range(2):
+        get_response = requests.get(url, allow_redirects=False)
+        assert get_response.status_code == HTTPStatus.TEMPORARY_REDIRECT
+        assert get_response.headers.get('Location') == 'http://ya.ru'
+    if not LOG_BACKEND:
+        # The log store serves redirects from its index without a cache.
+        stats = requests.get('http://127.0.0.1:8080/api/v1/stats/cache').json()
+        assert stats['hits'] >= 1
+    requests.delete(url)
+    get_response = requests.get(url, allow_redirects=False)
+    assert get_response.status_code == HTTPStatus.GONE
+
+
+def test_status_counts_queued_clicks(start_server):
+    post_response = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/',
+        json={
+            'origin_url': 'http://ya.ru'
+        }
+    )
+    url = post_response.json().get('short_url')
+    for _ in range(3):
+        requests.get(url, allow_redirects=False)
+    assert wait_for_clicks(url, 3).get('requests_number') == 3
+
+
+def test_create_multi_short_url_batch_limit(start_server):
+    response = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/shorten',
+        json=[{'origin_url': 'http://ya.ru'}] * 10001
+    )
+    assert response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+def test_status_keyset_pagination(start_server):
+    post_response = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/',
+        json={
+            'origin_url': 'http://ya.ru'
+        }
+    )
+    url = post_response.json().get('short_url')
+    for _ in range(3):
+        requests.get(url, allow_redirects=False)
+    wait_for_clicks(url, 3)
+    params = {'full-info': True, 'max-size': 2}
+    first_page = requests.get(url + '/status', params=params)
+    assert len(first_page.json()) == 2
+    cursor = first_page.headers['X-Next-Cursor']
+    second_page = requests.get(
+        url + '/status', params={**params, 'after': cursor}
+    )
+    assert len(second_page.json()) == 1
+    assert 'X-Next-Cursor' not in second_page.headers
+    assert second_page.json()[0] not in first_page.json()
+
+
+def test_export(start_server):
+    post_response = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/',
+        json={
+            'origin_url': 'http://ya.ru'
+        }
+    )
+    url = post_response.json().get('short_url')
+    for _ in range(2):
+        requests.get(url, allow_redirects=False)
+    wait_for_clicks(url, 2)
+    ndjson_lines = requests.get(url + '/export').text.splitlines()
+    assert len(ndjson_lines) == 2
+    cursor = json.loads(ndjson_lines[0])['cursor']
+    csv_lines = requests.get(
+        url + '/export', params={'format': 'csv', 'after': cursor}
+    ).text.splitlines()
+    assert csv_lines[0] == 'cursor,made_at,client_host,client_port'
+    assert len(csv_lines) == 2
+
+
+def test_stats(start_server):
+    post_response = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/',
+        json={
+            'origin_url': 'http://ya.ru'
+        }
+    )
+    url = post_response.json().get('short_url')
+    stats_response = requests.get(
+        url + '/stats', params={'granularity': 'minute'}
+    )
+    assert stats_response.status_code == HTTPStatus.OK
+    assert stats_response.json() == []
+    stats_response = requests.get(url + '/stats', params={'granularity': 'day'})
+    assert stats_response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.skipif(LOG_BACKEND, reason='the log store uses no pool')
+def test_pool_stats(start_server):
+    before = requests.get('http://127.0.0.1:8080/api/v1/stats/pool').json()
+    requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/',
+        json={'origin_url': 'http://ya.ru'}
+    )
+    stats = requests.get('http://127.0.0.1:8080/api/v1/stats/pool').json()
+    assert stats['checkouts'] > before['checkouts']
+    assert stats['connects'] >= 1
+    assert {'checked_out', 'wait_seconds_total', 'overflows'} <= set(stats)
+
+
+def test_metrics(start_server):
+    requests.get('http://127.0.0.1:8080/api/v1/short_url/unknown/status')
+    response = requests.get('http://127.0.0.1:8080/metrics')
+    assert response.status_code == HTTPStatus.OK
+    assert (
+        'http_requests_total{method="GET",'
+        'route="/api/v1/short_url/{url_id}/status",status="404"}'
+    ) in response.text
+    if LOG_BACKEND:
+        assert 'store_clicks ' in response.text
+    else:
+        assert 'db_query_duration_seconds_count{operation="SELECT"}' in response.text
+
+
+def test_redirect_fast_path(start_server):
+    base_url = 'http://127.0.0.1:8080/api/v1/short_url/'
+    response = requests.get(base_url + 'unknown', allow_redirects=False)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Item not found'}
+    url = requests.post(
+        base_url, json={'origin_url': 'http://ya.ru/a b?q=1'}
+    ).json().get('short_url')
+    response = requests.get(url, allow_redirects=False)
+    assert response.status_code == HTTPStatus.TEMPORARY_REDIRECT
+    assert response.headers['Location'] == 'http://ya.ru/a%20b?q=1'
+    assert response.content == b''
+    requests.delete(url)
+    response = requests.get(url, allow_redirects=False)
+    assert response.status_code == HTTPStatus.GONE
+    assert response.json() == {'detail': 'Item is deleted'}
+    metrics = requests.get('http://127.0.0.1:8080/metrics').text
+    assert (
+        'http_requests_total{method="GET",'
+        'route="/api/v1/short_url/{url_id}",status="307"}'
+    ) in metrics
+
+
+def test_redirect_policy(start_server):
+    url = requests.post(
+        'http://127.0.0.1:8080/api/v1/short_url/',
+        json={
+            'origin_url': 'http://ya.ru',
+            'redirect_status': 301,
+            'cache_max_age': 3600
+        }
+    ).json().get('short_url')
+    response = requests.get(url, allow_redirects=False)
+    assert response.status_code == HTTPStatus.MOVED_PERMANENTLY
+    assert response.headers['Cache-Control'] == 'public, max-age=3600'
+    assert response.headers['Last-Modified']
+    etag = response.headers['ETag']
+    response = requests.head(url)
+    assert response.status_code == HTTPStatus.MOVED_PERMANENTLY
+    assert response.headers['ETag'] == etag
+    response = requests.get(
+        url, headers={'If-None-Match': etag}, allow_redirects=False
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert 'Location' not in response.headers
+    assert wait_for_clicks(url, 2)['requests_number'] == 2
@@ -0,0 +1,727 @@
+import asyncio
+import errno
+import ipaddress
+import json
+import logging
+import os
+import random
+from datetime import date, datetime
+
+import orjson
+import pytest
+import shortuuid
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.api.v1.tools import status_page
+from src.core.config import AppSettings
+from src.core.logger import JsonFormatter, SamplingFilter
+from src.db.replicas import Replica, ReplicaSet
+from src.middlewares.black_list import BlackListHostMiddleware, HostMatcher
+from src.middlewares.rate_limit import TokenBucketStore
+from src.models.urls_app import Request as RequestModel
+from src.models.urls_app import RequestRollup as RequestRollupModel
+from src.models.urls_app import RollupState as RollupStateModel
+from src.models.urls_app import ShortUrl as ShortUrlModel
+from src.models.urls_app import short_form_seq
+from src.schemas.short_url import (ListRequest, MultiShortUrlCreate,
+                                   ShortUrlCreate)
+from src.services import allocator
+from src.services.bloom import BloomFilter, ShortFormFilter
+from src.services.cache import LRUCache
+from src.services.clicks import FENCE_LOCK_ID, ClickEvent, ClickWriter, inet_host
+from src.services.dedup import normalize_url, origin_hash
+from src.services.log_store import ClickRow, LogStore
+from src.services.partitions import PartitionManager, add_months
+from src.services.purge import DeletedLinkPurger
+from src.services.rollups import RollupAggregator
+from src.services.shared_table import SharedRedirectTable, build_buffer
+from src.services.urls_app import RepositoryShortUrl
+
+
+def test_lru_cache_eviction_and_ttl():
+    now = [0.0]
+    cache = LRUCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    now[0] = 11
+    assert cache.get('a') is None
+    assert cache.stats() == {
+        'size': 1,
+        'maxsize': 2,
+        'ttl': 10,
+        'hits': 2,
+        'misses': 2,
+        'evictions': 1,
+    }
+
+
+def test_short_form_encoding_is_reversible_and_unique():
+    codes = [allocator.encode(number) for number in range(1, 5001)]
+    assert len(set(codes)) == len(codes)
+    alphabet = set(shortuuid.get_alphabet())
+    for number, code in enumerate(codes, start=1):
+        assert len(code) == allocator.CODE_LENGTH
+        assert code[0] not in alphabet
+        assert allocator.decode(code) == number
+    assert allocator.decode('abcdef') is None
+
+
+def test_host_matcher():
+    matcher = HostMatcher(['bad.com', '*.Example.com'])
+    assert matcher.matches('bad.com')
+    assert matcher.matches('a.example.com')
+    assert matcher.matches('a.b.example.com')
+    assert not matcher.matches('example.com')
+    assert not matcher.matches('good.com')
+    assert not matcher.matches('sub.bad.com')
+    assert HostMatcher(['*']).matches('anything')
+
+
+def test_black_list_reloads_file(tmp_path):
+    blocked_hosts_file = tmp_path / 'hosts.txt'
+    blocked_hosts_file.write_text('# abuse list\nbad.com\n')
+    middleware = BlackListHostMiddleware(
+        None, blocked_hosts_file=str(blocked_hosts_file)
+    )
+    assert middleware.matcher.matches('bad.com')
+    blocked_hosts_file.write_text('*.evil.com\n')
+    os.utime(blocked_hosts_file, ns=(0, 0))
+    asyncio.run(middleware.reload())
+    assert not middleware.matcher.matches('bad.com')
+    assert middleware.matcher.matches('www.evil.com')
+
+
+def test_token_bucket_store():
+    now = [0.0]
+    store = TokenBucketStore(shards=2, idle_ttl=5, timer=lambda: now[0])
+    assert store.take('client', rate=1, burst=2) == 0
+    assert store.take('client', rate=1, burst=2) == 0
+    assert store.take('client', rate=1, burst=2) == 1
+    now[0] = 1
+    assert store.take('client', rate=1, burst=2) == 0
+    now[0] = 10
+    store.take('other', rate=1, burst=2)
+    now[0] = 11
+    store.take('other', rate=1, burst=2)
+    assert store.evictions == 1
+    assert len(store) == 1
+
+
+def test_short_form_filter_trusts_only_settled_codes():
+    short_form_filter = ShortFormFilter(capacity=100, error_rate=0.01)
+    assert not short_form_filter.is_absent('abcdef')
+    short_form_filter.bloom = BloomFilter(100, 0.01)
+    short_form_filter.bloom.add('abcdef')
+    short_form_filter.trusted_upto = 10
+    assert not short_form_filter.is_absent('abcdef')
+    assert short_form_filter.is_absent('zzzzzz')
+    assert short_form_filter.is_absent(allocator.encode(5))
+    assert not short_form_filter.is_absent(allocator.encode(11))
+    assert short_form_filter.stats()['rejected'] == 2
+
+
+def test_short_form_filter_rebuilds_incrementally():
+    engine = create_async_engine(os.environ['DATABASE_DSN'])
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    crud = RepositoryShortUrl(
+        ShortUrlModel,
+        RequestModel,
+        allocator=allocator.ShortFormAllocator(short_form_seq, block_size=10)
+    )
+    short_form_filter = ShortFormFilter(
+        capacity=1000000, error_rate=0.01, scan_overlap=60
+    )
+
+    async def create(origin_url, created_at=None):
+        async with session_factory() as session:
+            link = await crud.create(
+                session, obj_in=ShortUrlCreate(origin_url=origin_url)
+            )
+            if created_at is not None:
+                link.created_at = created_at
+                await session.commit()
+        return link.short_form
+
+    async def run():
+        await short_form_filter.rebuild(
+            session_factory, ShortUrlModel, short_form_seq
+        )
+        fresh = await create('http://example.com/bloom-fresh')
+        # Committed after the scan but stamped long before it started.
+        old = await create(
+            'http://example.com/bloom-old', datetime(2000, 1, 1)
+        )
+        await short_form_filter.rebuild(
+            session_factory, ShortUrlModel, short_form_seq
+        )
+        await engine.dispose()
+        return fresh, old
+
+    fresh, old = asyncio.run(run())
+    assert fresh in short_form_filter.bloom
+    assert old not in short_form_filter.bloom
+    stats = short_form_filter.stats()
+    assert stats['rebuilds'] == 2
+    assert stats['full_rebuilds'] == 1
+
+
+def test_sampling_filter():
+    random.seed(1)
+    sampled = SamplingFilter(0.1)
+    record = logging.LogRecord('x', logging.INFO, '', 0, 'msg', None, None)
+    passed = sum(sampled.filter(record) for _ in range(10000))
+    assert 800 < passed < 1200
+    assert all(SamplingFilter(1).filter(record) for _ in range(100))
+
+
+def test_json_formatter():
+    record = logging.LogRecord(
+        'api_logger', logging.INFO, '', 0, 'Redirect to %s', ('x',), None
+    )
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload['message'] == 'Redirect to x'
+    assert payload['logger'] == 'api_logger'
+    assert payload['level'] == 'INFO'
+
+
+class FakePool:
+    def __init__(self, checked_out):
+        self.checked_out = checked_out
+
+    def checkedout(self):
+        return self.checked_out
+
+
+class FakeEngine:
+    def __init__(self, checked_out=0):
+        self.pool = FakePool(checked_out)
+
+
+def test_redirect_status_from_env(monkeypatch):
+    monkeypatch.setenv('REDIRECT_STATUS', '302')
+    assert AppSettings().redirect_status == 302
+    monkeypatch.setenv('REDIRECT_STATUS', '200')
+    with pytest.raises(ValidationError):
+        AppSettings()
+
+
+def test_replica_set_selection():
+    replicas = [
+        Replica(f'replica{index}', FakeEngine(checked_out), f'session{index}')
+        for index, checked_out in enumerate((3, 1, 2))
+    ]
+    round_robin = ReplicaSet('primary', replicas)
+    assert [round_robin.session_factory() for _ in range(4)] == [
+        'session0', 'session1', 'session2', 'session0'
+    ]
+    least = ReplicaSet('primary', replicas, strategy='least_connections')
+    assert least.session_factory() == 'session1'
+    replicas[1].healthy = False
+    assert least.session_factory() == 'session2'
+    for replica in replicas:
+        replica.healthy = False
+    assert least.session_factory() == 'primary'
+    assert least.stats()['primary_reads'] == 1
+
+
+def test_replica_set_check_ejects_and_restores():
+    dsn = os.environ['DATABASE_DSN']
+    replica = Replica('replica0', create_async_engine(dsn), 'session')
+    down = Replica(
+        'replica1',
+        create_async_engine(make_url(dsn).set(database='missing_db')),
+        'down'
+    )
+    replicas = ReplicaSet('primary', [replica, down], max_lag=1)
+    replica.healthy = False
+    asyncio.run(replicas.check())
+    assert replica.healthy and replica.lag == 0
+    assert not down.healthy and down.ejections == 1
+    assert replicas.stats()['healthy'] == 1
+
+
+def test_partition_manager_premakes_and_drops():
+    engine = create_async_engine(os.environ['DATABASE_DSN'])
+    manager = PartitionManager(
+        engine, 'test_partitioned', ahead=2, retention_months=1
+    )
+    current = datetime.utcnow().date().replace(day=1)
+    old = add_months(current, -3)
+
+    async def run():
+        async with engine.begin() as connection:
+            await connection.execute(text(
+                'DROP TABLE IF EXISTS test_partitioned'
+            ))
+            await connection.execute(text(
+                'CREATE TABLE test_partitioned (made_at timestamp) '
+                'PARTITION BY RANGE (made_at)'
+            ))
+            await connection.execute(text(
+                f'CREATE TABLE {manager.partition_name(old)} '
+                'PARTITION OF test_partitioned '
+                f"FOR VALUES FROM ('{old}') TO ('{add_months(old, 1)}')"
+            ))
+        await manager.run()
+        await manager.run()
+        async with engine.begin() as connection:
+            results = await connection.execute(text(
+                "SELECT relname FROM pg_class WHERE relkind = 'r' "
+                "AND relname LIKE 'test_partitioned_y%' ORDER BY relname"
+            ))
+            names = list(results.scalars())
+            await connection.execute(text('DROP TABLE test_partitioned'))
+        await engine.dispose()
+        return names
+
+    assert asyncio.run(run()) == [
+        manager.partition_name(add_months(current, offset))
+        for offset in range(3)
+    ]
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+
+
+def test_log_store_rebuild_and_compaction(tmp_path):
+    path = str(tmp_path / 'links.log')
+    store = LogStore(path)
+    store.open()
+    first, second = store.create_links(
+        [
+            {'origin_url': 'http://ya.ru', 'redirect_status': 301},
+            {'origin_url': 'http://example.com'},
+        ],
+        lambda code: '/' + code
+    )
+    for port in range(3):
+        store.add_click(first, datetime.utcnow(), '127.0.0.1', port)
+    store.delete(second)
+    store.close()
+
+    with open(path, 'ab') as file:
+        file.write(b'{"t":"C","id"')
+    store = LogStore(path)
+    store.open()
+    assert set(store.links) == {first.short_form, second.short_form}
+    loaded = store.links[first.short_form]
+    assert loaded.requests_number == 3
+    assert loaded.redirect_status == 301
+    assert sum(loaded.minute_clicks.values()) == 3
+    assert [row.client_port for row in store.read_clicks(loaded, 1)] == [1, 2]
+    assert store.links[second.short_form].deleted
+    assert store.garbage_records == 1
+    with pytest.raises(RuntimeError):
+        LogStore(path).open()
+
+    size = os.path.getsize(path)
+    assert store.compact(click_retention=0)
+    assert os.path.getsize(path) < size
+    assert loaded.requests_number == 3
+    assert store.read_clicks(loaded, 0) == []
+    store.add_click(loaded, datetime.utcnow(), '127.0.0.2', 80)
+    store.close()
+
+    store = LogStore(path)
+    store.open()
+    loaded = store.links[first.short_form]
+    assert loaded.requests_number == 4
+    assert store.read_clicks(loaded, 0)[0].client_host == '127.0.0.2'
+    assert store.stats()['garbage_records'] == 0
+    store.close()
+
+
+def test_log_store_cuts_failed_writes_and_skips_stray_deletes(
+        tmp_path, monkeypatch
+):
+    path = str(tmp_path / 'links.log')
+    store = LogStore(path)
+    store.open()
+    link, = store.create_links(
+        [{'origin_url': 'http://ya.ru'}], lambda code: '/' + code
+    )
+    write = os.write
+
+    def write_and_fail(fd, data):
+        write(fd, data[:5])
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'write', write_and_fail)
+        with pytest.raises(OSError):
+            store.add_click(link, datetime.utcnow(), '127.0.0.1', 80)
+    assert store.stats()['file_bytes'] == os.path.getsize(path)
+    assert link.requests_number == 0
+    store.add_click(link, datetime.utcnow(), '127.0.0.1', 81)
+    store.close()
+
+    with open(path, 'ab') as file:
+        file.write(b'{"t":"D","id":999}\n')
+    store = LogStore(path)
+    store.open()
+    loaded = store.links[link.short_form]
+    assert [row.client_port for row in store.read_clicks(loaded, 0)] == [81]
+    assert sum(loaded.minute_clicks.values()) == 1
+    assert store.garbage_records == 1
+    store.close()
+
+
+def test_shared_redirect_table(tmp_path):
+    path = str(tmp_path / 'redirects')
+    writer = SharedRedirectTable(path, slots=8, heap_size=64, hot_window=60)
+    reader = SharedRedirectTable(path, slots=8, heap_size=64, hot_window=60)
+    assert reader.lookup('abc123') is None
+    writer._create()
+    created_at = datetime(2022, 11, 1, 12, 30)
+    policy = (created_at, None, None)
+    entries = [
+        (1, 'abc123', 'http://ya.ru', False, *policy),
+        (2, 'xyz789', 'http://example.com', True, created_at, 301, 0),
+        (3, 'too_long_', 'http://a.b', False, *policy),
+        (4, 'big', 'http://' + 'a' * 64, False, *policy),
+        (5, 'ok5', 'http://c.d', False, None, None, None),
+        (6, 'ok6', 'http://e.f', False, *policy),
+        (7, 'over', 'http://g.h', False, *policy),
+    ]
+    buffer_data, count = build_buffer(entries, writer.slots, writer.heap_size)
+    assert count == 4
+    writer.publish(buffer_data)
+    reader._attach()
+    assert reader.lookup('abc123') == (1, 'http://ya.ru', False, *policy)
+    assert reader.lookup('xyz789') == (
+        2, 'http://example.com', True, created_at, 301, 0
+    )
+    assert reader.lookup('ok6') == (6, 'http://e.f', False, *policy)
+    assert reader.lookup('too_long_') is None
+    assert reader.lookup('big') is None
+    assert reader.lookup('over') is None
+
+    reader.mark_deleted('abc123')
+    assert writer.lookup('abc123') == (1, 'http://ya.ru', True, *policy)
+
+    writer.publish(build_buffer(entries[4:5], 8, 64)[0])
+    assert reader.lookup('abc123') is None
+    assert reader.lookup('ok5') == (5, 'http://c.d', False, None, None, None)
+    assert reader.stats()['hits'] == 4
+    asyncio.run(reader.close())
+    asyncio.run(writer.close())
+
+
+def test_normalize_url():
+    assert normalize_url('HTTP://Example.COM:80') == 'http://example.com/'
+    assert normalize_url(
+        'https://user@example.com:8443/a?b=1#top'
+    ) == 'https://user@example.com:8443/a?b=1#top'
+    assert normalize_url('http://[::1]:80/') == 'http://[::1]/'
+    assert origin_hash('http://example.com/#fragment') == origin_hash(
+        'http://EXAMPLE.com/#fragment'
+    )
+    assert origin_hash('http://example.com/app#/a') != origin_hash(
+        'http://example.com/app#/b'
+    )
+    assert origin_hash('http://example.com/a') != origin_hash(
+        'http://example.com/b'
+    )
+
+
+def test_create_deduplicates_origin_urls():
+    engine = create_async_engine(os.environ['DATABASE_DSN'])
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    crud = RepositoryShortUrl(
+        ShortUrlModel,
+        RequestModel,
+        allocator=allocator.ShortFormAllocator(short_form_seq, block_size=10),
+        chunk_size=2,
+        dedup=True
+    )
+    origin = f'http://dedup-{shortuuid.uuid()}.example.com'
+
+    async def run():
+        async with session_factory() as session:
+            first = await crud.create(
+                session, obj_in=ShortUrlCreate(origin_url=origin)
+            )
+            again = await crud.create(
+                session, obj_in=ShortUrlCreate(origin_url=origin.upper())
+            )
+            permanent = await crud.create(
+                session,
+                obj_in=ShortUrlCreate(origin_url=origin, redirect_status=301)
+            )
+            links = await crud.create_multi(
+                session,
+                obj_in=MultiShortUrlCreate.parse_obj([
+                    {'origin_url': origin + '/other'},
+                    {'origin_url': origin + '/'},
+                    {'origin_url': origin + '/other#part'},
+                    {'origin_url': origin, 'redirect_status': 301},
+                    {'origin_url': origin, 'cache_max_age': 60},
+                ])
+            )
+        await engine.dispose()
+        return first, again, permanent, links
+
+    first, again, permanent, links = asyncio.run(run())
+    assert again.short_form == first.short_form
+    assert permanent.short_form != first.short_form
+    assert permanent.redirect_status == 301
+    assert links[1].short_form == first.short_form
+    assert links[0].short_form != first.short_form
+    assert links[2].short_form not in (first.short_form, links[0].short_form)
+    assert str(links[2].origin_url) == origin + '/other#part'
+    assert links[3].short_form == permanent.short_form
+    assert links[4].short_form not in (first.short_form, permanent.short_form)
+    assert links[4].cache_max_age == 60
+
+
+def test_purge_deleted_links():
+    engine = create_async_engine(os.environ['DATABASE_DSN'])
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    crud = RepositoryShortUrl(
+        ShortUrlModel,
+        RequestModel,
+        allocator=allocator.ShortFormAllocator(short_form_seq, block_size=10)
+    )
+    purger = DeletedLinkPurger(
+        session_factory,
+        ShortUrlModel,
+        RequestModel,
+        RequestRollupModel,
+        grace_period=0,
+        batch_size=1,
+        click_batch_size=2
+    )
+    purged_links = purger.purged_links
+
+    async def run():
+        async with session_factory() as session:
+            links = await crud.create_multi(
+                session,
+                obj_in=MultiShortUrlCreate.parse_obj([
+                    {'origin_url': 'http://example.com/purge1'},
+                    {'origin_url': 'http://example.com/purge2'},
+                ])
+            )
+            session.add_all(
+                RequestModel(
+                    url_id=links[0].id, client_host='127.0.0.1',
+                    client_port=port
+                )
+                for port in range(5)
+            )
+            await session.commit()
+            deleted = await crud.delete_multi(
+                session, url_ids=[links[0].short_form]
+            )
+            assert [row.id for row in deleted] == [links[0].id]
+        await purger.run()
+        async with session_factory() as session:
+            results = await session.execute(
+                select(ShortUrlModel.id).where(
+                    ShortUrlModel.id.in_([link.id for link in links])
+                )
+            )
+            remaining = results.scalars().all()
+            results = await session.execute(
+                select(func.count()).where(
+                    RequestModel.url_id == links[0].id
+                )
+            )
+            clicks = results.scalar_one()
+        await engine.dispose()
+        return links, remaining, clicks
+
+    links, remaining, clicks = asyncio.run(run())
+    assert remaining == [links[1].id]
+    assert clicks == 0
+    assert purger.purged_links - purged_links >= 1
+
+
+def test_rollups_count_clicks_committed_out_of_order():
+    engine = create_async_engine(os.environ['DATABASE_DSN'])
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    crud = RepositoryShortUrl(
+        ShortUrlModel,
+        RequestModel,
+        allocator=allocator.ShortFormAllocator(short_form_seq, block_size=10)
+    )
+    aggregator = RollupAggregator(
+        session_factory,
+        RequestModel,
+        RequestRollupModel,
+        RollupStateModel,
+        batch_size=100000
+    )
+
+    async def insert_clicks(session, link_id, number):
+        await session.execute(
+            select(func.pg_advisory_xact_lock_shared(FENCE_LOCK_ID))
+        )
+        session.add_all(
+            RequestModel(
+                url_id=link_id, client_host='127.0.0.1', client_port=port
+            )
+            for port in range(number)
+        )
+        await session.flush()
+
+    async def run():
+        async with session_factory() as session:
+            link = await crud.create(
+                session,
+                obj_in=ShortUrlCreate(
+                    origin_url='http://example.com/rollups'
+                )
+            )
+        async with session_factory() as early, session_factory() as late:
+            # Lower ids stay uncommitted while higher ids are committed.
+            await insert_clicks(early, link.id, 3)
+            await insert_clicks(late, link.id, 2)
+            await late.commit()
+            folding = asyncio.create_task(aggregator.run())
+            await asyncio.sleep(0.5)
+            assert not folding.done()
+            await early.commit()
+            await folding
+        await aggregator.run()
+        async with session_factory() as session:
+            results = await session.execute(
+                select(
+                    RequestRollupModel.granularity,
+                    func.sum(RequestRollupModel.requests_number)
+                ).where(
+                    RequestRollupModel.url_id == link.id
+                ).group_by(
+                    RequestRollupModel.granularity
+                )
+            )
+            counts = dict(results.all())
+        await engine.dispose()
+        return counts
+
+    assert asyncio.run(run()) == {'minute': 5, 'hour': 5}
+
+
+def test_click_writer_drops_only_rejected_clicks():
+    engine = create_async_engine(os.environ['DATABASE_DSN'])
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    crud = RepositoryShortUrl(
+        ShortUrlModel,
+        RequestModel,
+        allocator=allocator.ShortFormAllocator(short_form_seq, block_size=10)
+    )
+    writer = ClickWriter(
+        session_factory,
+        RequestModel.__table__,
+        ShortUrlModel.__table__,
+        batch_size=10,
+        flush_interval=10,
+        queue_size=10
+    )
+
+    async def run():
+        async with session_factory() as session:
+            link = await crud.create(
+                session,
+                obj_in=ShortUrlCreate(origin_url='http://example.com/clicks')
+            )
+        writer.start()
+        # The second click references no link and fails the foreign key.
+        for url_id in (link.id, 2 ** 31 - 1, link.id, link.id):
+            await writer.put(ClickEvent(
+                url_id, datetime.utcnow(), '127.0.0.1', 80
+            ))
+        await writer.stop()
+        async with session_factory() as session:
+            clicks = await session.scalar(
+                select(func.count()).where(RequestModel.url_id == link.id)
+            )
+            requests_number = await session.scalar(
+                select(ShortUrlModel.requests_number).where(
+                    ShortUrlModel.id == link.id
+                )
+            )
+        await engine.dispose()
+        return clicks, requests_number
+
+    assert asyncio.run(run()) == (3, 3)
+    assert writer.stats()['written'] == 3
+    assert writer.stats()['dropped'] == 1
+
+
+def test_deletes_evict_cached_links_of_every_worker():
+    engine = create_async_engine(os.environ['DATABASE_DSN'])
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    workers = [
+        RepositoryShortUrl(
+            ShortUrlModel,
+            RequestModel,
+            allocator=allocator.ShortFormAllocator(
+                short_form_seq, block_size=10
+            ),
+            cache=LRUCache(maxsize=10, ttl=3600)
+        )
+        for _ in range(2)
+    ]
+    deleting, serving = workers
+
+    async def run():
+        listener = asyncio.create_task(serving.listen_deleted(engine))
+        async with session_factory() as session:
+            link = await deleting.create(
+                session,
+                obj_in=ShortUrlCreate(origin_url='http://example.com/evict')
+            )
+            # Listening starts with an empty cache.
+            await asyncio.sleep(0.5)
+            await serving.get_cached(session, link.short_form)
+            assert serving.cache.get(link.short_form) is not None
+            await deleting.delete_multi(session, url_ids=[link.short_form])
+        for _ in range(20):
+            if serving.cache.get(link.short_form) is None:
+                break
+            await asyncio.sleep(0.05)
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        await engine.dispose()
+        return serving.cache.get(link.short_form)
+
+    assert asyncio.run(run()) is None
+
+
+def test_inet_host_and_derived_short_url():
+    assert inet_host('10.0.0.1') == '10.0.0.1'
+    assert inet_host('::1') == '::1'
+    assert inet_host('testclient') is None
+    link = ShortUrlModel(origin_url='http://ya.ru', short_form='abc123')
+    assert link.short_url.endswith('/api/v1/short_url/abc123')
+
+
+def test_status_page_matches_response_model():
+    rows = [
+        ClickRow(1, datetime(2022, 11, 1, 12), ipaddress.ip_address('::1'), 80),
+        ClickRow(2, datetime(2022, 11, 1, 12, 0, 0, 5), None, 8080),
+        ClickRow(3, datetime(2022, 11, 1, 13), '10.0.0.1', 443),
+    ]
+    assert status_page(rows) == orjson.dumps(
+        jsonable_encoder(ListRequest.parse_obj(rows))
+    )